@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+CMDB 스냅샷 압축 변환 도구
+S3의 {category}.json 스냅샷을 {category}.json.gz / {category}.json.zst로 변환해서 함께 업로드
+(원본은 유지하며, MCP 서버와 Streamlit 로더는 압축본이 있으면 우선 사용)
+
+사용 예:
+    python convert_snapshots.py --provider aws --format gz
+    python convert_snapshots.py --provider gcp --date 20241223 --format zst
+"""
+import argparse
+import gzip
+import shutil
+import tempfile
+
+import boto3
+
+S3_BUCKET = "mwaa-cmdb-bucket"
+PROVIDERS = {
+    'aws': 'aws-policies',
+    'gcp': 'gcp-policies',
+}
+CHUNK_SIZE = 1024 * 1024
+
+def compress_stream(source, target, fmt, level):
+    """source 스트림을 target 파일로 압축 (메모리에 전체를 올리지 않음)"""
+    if fmt == 'gz':
+        with gzip.GzipFile(fileobj=target, mode='wb', compresslevel=level, mtime=0) as out:
+            shutil.copyfileobj(source, out, CHUNK_SIZE)
+    else:
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=level)
+        compressor.copy_stream(source, target, read_size=CHUNK_SIZE, write_size=CHUNK_SIZE)
+
+def list_snapshot_keys(s3_client, bucket, provider, date=None):
+    """변환 대상 .json 키와 이미 존재하는 키 집합"""
+    prefix = f"{PROVIDERS[provider]}/{date}/" if date else f"{PROVIDERS[provider]}/"
+    paginator = s3_client.get_paginator('list_objects_v2')
+    keys = {}
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            keys[obj['Key']] = obj['Size']
+    return {k: size for k, size in keys.items() if k.endswith('.json')}, set(keys)
+
+def convert(s3_client, bucket, provider, fmt, date=None, level=None, force=False, dry_run=False):
+    suffix = f".{fmt}"
+    level = level if level is not None else (9 if fmt == 'gz' else 10)
+    sources, existing = list_snapshot_keys(s3_client, bucket, provider, date)
+    
+    total_before = total_after = converted = 0
+    for key, size in sorted(sources.items()):
+        target_key = key + suffix
+        if target_key in existing and not force:
+            print(f"⏭️  건너뜀 (이미 존재): {target_key}")
+            continue
+        if dry_run:
+            print(f"📝 변환 예정: {key} ({size:,} bytes) → {target_key}")
+            continue
+        
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+        with tempfile.SpooledTemporaryFile(max_size=64 * CHUNK_SIZE) as buffer:
+            compress_stream(response['Body'], buffer, fmt, level)
+            compressed_size = buffer.tell()
+            buffer.seek(0)
+            s3_client.upload_fileobj(
+                buffer, bucket, target_key,
+                ExtraArgs={"ContentType": "application/gzip" if fmt == 'gz' else "application/zstd"}
+            )
+        
+        converted += 1
+        total_before += size
+        total_after += compressed_size
+        ratio = size / compressed_size if compressed_size else 0
+        print(f"✅ {key}: {size:,} → {compressed_size:,} bytes ({ratio:.1f}x)")
+    
+    if converted:
+        print(f"\n🎉 {converted}개 변환: {total_before:,} → {total_after:,} bytes "
+              f"({total_before / max(total_after, 1):.1f}x)")
+    return converted
+
+def main():
+    parser = argparse.ArgumentParser(description="CMDB 스냅샷 압축 변환")
+    parser.add_argument("--bucket", default=S3_BUCKET)
+    parser.add_argument("--provider", choices=list(PROVIDERS), default='aws')
+    parser.add_argument("--date", help="변환할 날짜 (YYYYMMDD), 생략시 전체")
+    parser.add_argument("--format", choices=['gz', 'zst'], default='gz',
+                        help="gz: 표준 라이브러리, zst: zstandard 패키지 필요 (더 빠른 압축 해제)")
+    parser.add_argument("--level", type=int, help="압축 레벨 (기본 gz 9, zst 10)")
+    parser.add_argument("--force", action="store_true", help="이미 압축본이 있어도 다시 변환")
+    parser.add_argument("--dry-run", action="store_true", help="변환 대상만 출력")
+    args = parser.parse_args()
+    
+    convert(boto3.client('s3'), args.bucket, args.provider, args.format,
+            date=args.date, level=args.level, force=args.force, dry_run=args.dry_run)
+
+if __name__ == "__main__":
+    main()
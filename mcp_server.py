@@ -3,45 +3,1423 @@
 CMDB MCP Server
 S3에 저장된 AWS/GCP CMDB 정책 데이터를 조회하는 MCP 서버
 """
+import argparse
+import asyncio
+import atexit
+import contextlib
+import gzip
+import hashlib
 import json
-import boto3
-from datetime import datetime
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from mcp.server import Server
 from mcp.types import Tool, TextContent
-import mcp.server.stdio
 
-# S3 설정
+# S3 설정 (boto3 import와 클라이언트 생성은 첫 S3 호출까지 지연)
 S3_BUCKET = "mwaa-cmdb-bucket"
-s3_client = boto3.client('s3')
+s3_client = None
+_s3_client_lock = threading.Lock()
+
+# 클라우드 제공자별 S3 prefix
+PROVIDERS = {
+    'aws': 'aws-policies',
+    'gcp': 'gcp-policies',
+}
+DEFAULT_PROVIDER = 'aws'
+# 날짜 폴더 목록 캐시 유지 시간 (초)
+DATE_INDEX_TTL = 300
+# 스냅샷 파일 확장자 우선순위 (압축본이 있으면 우선 사용)
+SNAPSHOT_SUFFIXES = ('.json.zst', '.json.gz', '.json')
+
+# HTTP/SSE 모드 제한 (동시 연결 수, 동시 도구 실행 수, 대기열 길이)
+MAX_CONNECTIONS = int(os.getenv('CMDB_MCP_MAX_CONNECTIONS', '64'))
+MAX_CONCURRENT_TOOLS = int(os.getenv('CMDB_MCP_MAX_CONCURRENT_TOOLS', '8'))
+MAX_QUEUED_TOOLS = int(os.getenv('CMDB_MCP_MAX_QUEUED_TOOLS', '64'))
+
+# S3 병렬 로드 스레드 수 (여러 카테고리/제공자 스냅샷을 동시에 요청)
+LOADER_THREADS = int(os.getenv('CMDB_MCP_LOADER_THREADS', '32'))
+# 메모리에 유지할 과거(최신이 아닌) 날짜 수. 최신 날짜는 항상 유지
+CACHED_DATES = int(os.getenv('CMDB_MCP_CACHED_DATES', '3'))
+# 날짜별 집계 등 영구 캐시 디렉터리
+CACHE_DIR = os.getenv('CMDB_MCP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'cmdb-mcp'))
+# get_resource_trend 기본 조회 기간 (일)
+TREND_DEFAULT_DAYS = 90
+# 추이 조회에서 동시에 내려받아 파싱하는 스냅샷 수 (집계가 없는 날짜만, 메모리 사용량 제한)
+TREND_MAX_PARSES = int(os.getenv('CMDB_MCP_TREND_MAX_PARSES', '4'))
+# query_cmdb 최대 반환 행 수, 쿼리 제한 시간 (초)
+SQL_ROW_LIMIT = int(os.getenv('CMDB_MCP_SQL_ROW_LIMIT', '500'))
+SQL_TIMEOUT = float(os.getenv('CMDB_MCP_SQL_TIMEOUT', '10'))
+
+# 계측 로그 파일 (JSON lines). 설정하지 않으면 get_server_stats / /metrics로만 조회
+METRICS_LOG = os.getenv('CMDB_MCP_METRICS_LOG')
 
 # MCP 서버 초기화
 app = Server("cmdb-server")
 
-def get_latest_date():
+CATEGORIES = ['identity_policies', 'storage_policies', 'compute_policies',
+              'database_policies', 'network_policies', 'security_policies']
+
+class DateLRUCache(OrderedDict):
+    """최근 사용 순서 캐시 (키의 마지막 요소가 날짜)
+    
+    제공자별 최신 날짜 항목은 항상 유지하고, 그 외 항목이 max_size를 넘으면 가장 오래 사용하지
+    않은 것부터 제거. 공유 서버에서 여러 클라이언트가 과거 날짜를 조회해도 메모리가 계속 늘지 않음
+    """
+    def __init__(self, max_size, on_evict=None):
+        super().__init__()
+        self.max_size = max_size
+        self.on_evict = on_evict
+        self._lock = threading.RLock()
+    
+    def __getitem__(self, key):
+        with self._lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+    
+    def get(self, key, default=None):
+        with self._lock:
+            return self[key] if key in self else default
+    
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            self._evict()
+    
+    def _evict(self):
+        latest = {provider: cached[1][-1] for provider, cached in _date_index_cache.items() if cached[1]}
+        stale = [key for key in self if not _is_latest_key(key, latest)]
+        for key in stale[:max(0, len(stale) - self.max_size)]:
+            super().pop(key)
+            incr("cache.evictions")
+            if self.on_evict:
+                self.on_evict(key)
+
+def _is_latest_key(key, latest):
+    if isinstance(key, tuple):
+        provider = key[0] if key[0] in PROVIDERS else DEFAULT_PROVIDER
+        return latest.get(provider) == key[-1]
+    return latest.get(DEFAULT_PROVIDER) == key
+
+# 거버넌스 점검 결과 캐시: (provider, category, date) -> findings 리스트 (스냅샷과 함께 제거)
+_findings_cache = {}
+# 스냅샷 캐시: (provider, category, date) -> 데이터 (과거 스냅샷은 변경되지 않음)
+_snapshot_cache = DateLRUCache(CACHED_DATES * len(CATEGORIES) * len(PROVIDERS),
+                               on_evict=lambda key: _findings_cache.pop(key, None))
+# IAM 정책 평가 인덱스 캐시: date -> build_iam_index 결과 (AWS 전용)
+_iam_index_cache = DateLRUCache(CACHED_DATES)
+# 리소스 관계 그래프 캐시: (provider, date) -> build_resource_graph 결과
+_graph_cache = DateLRUCache(CACHED_DATES * len(PROVIDERS))
+# 날짜 폴더 목록 캐시: provider -> (조회 시각, [date, ...])
+_date_index_cache = {}
+# 날짜 폴더 안 파일 목록 캐시: (provider, date) -> (조회 시각, 파일명 집합)
+_date_files_cache = {}
+# 스냅샷 경량 집계 캐시: (provider, category, date) -> (저장 시각, 디스크 기록 여부, compute_aggregate 결과)
+_aggregate_cache = {}
+# SQL 조회용 DuckDB 읽기 전용 연결: (provider, date) -> connection (제거시 최신 날짜용 임시 파일 삭제)
+_sql_temp_paths = {}
+_sql_connection_cache = DateLRUCache(CACHED_DATES * len(PROVIDERS),
+                                     on_evict=lambda key: _remove_file(_sql_temp_paths.pop(key, None)))
+
+# 같은 스냅샷을 동시에 요청하면 한 번만 다운로드하도록 키별 락 사용
+_load_locks = {}
+_load_locks_guard = threading.Lock()
+
+def _key_lock(key):
+    """키별 락 (같은 키의 로드/인덱스 구축을 한 번만 수행)"""
+    with _load_locks_guard:
+        return _load_locks.setdefault(key, threading.Lock())
+_loader_pool = ThreadPoolExecutor(max_workers=LOADER_THREADS, thread_name_prefix="cmdb-loader")
+
+# ---------------------------------------------------------------------------
+# 지연 시간/크기 계측
+# ---------------------------------------------------------------------------
+
+_stats_lock = threading.Lock()
+_timings = {}   # span 이름 -> {"count", "total_ms", "max_ms"}
+_counters = {}  # 카운터 이름 -> 누적 값 (캐시 히트, 바이트 수 등)
+_started_at = time.time()
+
+def _write_metric(record):
+    if not METRICS_LOG:
+        return
+    record["ts"] = round(time.time(), 3)
+    try:
+        with _stats_lock, open(METRICS_LOG, 'a') as f:
+            f.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+def record_timing(name, elapsed_ms, **fields):
+    """span 소요 시간 누적"""
+    with _stats_lock:
+        stat = _timings.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stat["count"] += 1
+        stat["total_ms"] += elapsed_ms
+        stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+    _write_metric({"span": name, "ms": round(elapsed_ms, 2), **fields})
+
+def incr(name, value=1):
+    """카운터 증가"""
+    with _stats_lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+@contextlib.contextmanager
+def span(name, **fields):
+    """with 블록 소요 시간을 name으로 기록"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, (time.perf_counter() - start) * 1000, **fields)
+
+def get_server_stats():
+    """계측 값과 캐시 상태 요약"""
+    with _stats_lock:
+        timings = {
+            name: {
+                "count": stat["count"],
+                "avg_ms": round(stat["total_ms"] / stat["count"], 2),
+                "max_ms": round(stat["max_ms"], 2),
+                "total_ms": round(stat["total_ms"], 2)
+            }
+            for name, stat in sorted(_timings.items())
+        }
+        counters = dict(sorted(_counters.items()))
+    return {
+        "uptime_s": round(time.time() - _started_at, 1),
+        "timings": timings,
+        "counters": counters,
+        "caches": {
+            "snapshots": len(_snapshot_cache),
+            "findings": len(_findings_cache),
+            "iam_indexes": len(_iam_index_cache),
+            "graphs": len(_graph_cache),
+            "aggregates": len(_aggregate_cache),
+            "sql_databases": len(_sql_connection_cache),
+            "date_indexes": len(_date_index_cache),
+            "date_file_lists": len(_date_files_cache)
+        },
+        "tool_slots": {
+            "max_concurrent": MAX_CONCURRENT_TOOLS,
+            "running": _running_tools,
+            "queued": _queued_tools
+        }
+    }
+
+def get_s3_client():
+    """S3 클라이언트 (최초 호출시 생성)"""
+    global s3_client
+    if s3_client is None:
+        with _s3_client_lock:
+            if s3_client is None:
+                with span("startup.boto3_client"):
+                    import boto3
+                    s3_client = boto3.client('s3')
+    return s3_client
+
+def resolve_providers(provider=None):
+    """provider 인자(aws/gcp/all)를 제공자 리스트로 변환"""
+    if not provider:
+        return [DEFAULT_PROVIDER]
+    if provider == 'all':
+        return list(PROVIDERS)
+    if provider not in PROVIDERS:
+        raise ValueError(f"지원하지 않는 provider: {provider} (aws/gcp/all)")
+    return [provider]
+
+def _snapshot_index(provider=DEFAULT_PROVIDER):
+    """제공자 prefix 아래 날짜 폴더 목록 (Delimiter LIST, TTL 캐시)"""
+    cached = _date_index_cache.get(provider)
+    if cached and time.time() - cached[0] < DATE_INDEX_TTL:
+        incr("cache.date_index.hit")
+        return cached[1]
+    incr("cache.date_index.miss")
+    prefix = f"{PROVIDERS[provider]}/"
+    try:
+        with span("s3.list_dates", provider=provider):
+            paginator = get_s3_client().get_paginator('list_objects_v2')
+            dates = []
+            for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=prefix, Delimiter='/'):
+                dates += [p['Prefix'].split('/')[-2] for p in page.get('CommonPrefixes', [])]
+    except Exception:
+        return cached[1] if cached else []
+    _date_index_cache[provider] = (time.time(), dates)
+    return dates
+
+def _date_files(provider, date):
+    """날짜 폴더 안의 파일명 집합 (압축 변형 확인용, 폴더당 LIST 한 번, TTL 캐시)"""
+    cache_key = (provider, date)
+    cached = _date_files_cache.get(cache_key)
+    if cached and time.time() - cached[0] < DATE_INDEX_TTL:
+        return cached[1]
+    with _key_lock(('files',) + cache_key):
+        cached = _date_files_cache.get(cache_key)
+        if cached and time.time() - cached[0] < DATE_INDEX_TTL:
+            return cached[1]
+        prefix = f"{PROVIDERS[provider]}/{date}/"
+        try:
+            with span("s3.list_files", provider=provider, date=date):
+                response = get_s3_client().list_objects_v2(Bucket=S3_BUCKET, Prefix=prefix, Delimiter='/')
+            files = {obj['Key'][len(prefix):] for obj in response.get('Contents', [])}
+        except Exception:
+            return cached[1] if cached else set()
+        _date_files_cache[cache_key] = (time.time(), files)
+        return files
+
+def list_snapshot_dates(provider=DEFAULT_PROVIDER):
+    """제공자별 S3 날짜 폴더 목록 (정렬)"""
+    return sorted(_snapshot_index(provider))
+
+def _zstd():
+    """zstandard 모듈 (선택 의존성, 없으면 .json.zst는 사용하지 않음)"""
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+def resolve_snapshot_key(category, date, provider=DEFAULT_PROVIDER):
+    """읽을 스냅샷 객체 키 결정 (.json.zst > .json.gz > .json)"""
+    base = f"{PROVIDERS[provider]}/{date}/{category}"
+    files = _date_files(provider, date)
+    if not files:
+        return base + '.json'
+    for suffix in SNAPSHOT_SUFFIXES:
+        if suffix == '.json.zst' and _zstd() is None:
+            continue
+        if f"{category}{suffix}" in files:
+            return base + suffix
+    return base + '.json'
+
+def open_snapshot_stream(key, body):
+    """S3 응답 본문을 확장자에 맞게 스트리밍 압축 해제하는 파일 객체로 감싼다"""
+    if key.endswith('.gz'):
+        return gzip.GzipFile(fileobj=body)
+    if key.endswith('.zst'):
+        return _zstd().ZstdDecompressor().stream_reader(body)
+    return body
+
+def get_latest_date(provider=DEFAULT_PROVIDER):
     """S3에서 가장 최근 날짜 폴더 찾기"""
+    dates = list_snapshot_dates(provider)
+    return dates[-1] if dates else datetime.now().strftime('%Y%m%d')
+
+def fetch_snapshot(category, date, provider=DEFAULT_PROVIDER):
+    """S3에서 스냅샷 하나를 다운로드/파싱 (캐시하지 않음, 실패시 예외)"""
+    key = resolve_snapshot_key(category, date, provider)
+    with span("s3.get_object", key=key):
+        response = get_s3_client().get_object(Bucket=S3_BUCKET, Key=key)
+    size = response.get('ContentLength', 0)
+    incr("s3.bytes_fetched", size)
+    if not key.endswith('.json'):
+        incr("s3.compressed_objects")
+    # 다운로드와 압축 해제, 파싱이 스트림으로 이어지므로 한 구간으로 기록
+    with span("s3.read_and_parse", key=key, bytes=size):
+        with contextlib.closing(open_snapshot_stream(key, response['Body'])) as stream:
+            return json.load(stream)
+
+def load_cmdb_data(category, date=None, provider=DEFAULT_PROVIDER):
+    """S3에서 CMDB 데이터 로드 (스냅샷 단위 캐시, 최초 로드시 거버넌스 점검 수행)"""
+    if not date:
+        date = get_latest_date(provider)
+    
+    cache_key = (provider, category, date)
+    if cache_key in _snapshot_cache:
+        incr("cache.snapshot.hit")
+        return _snapshot_cache[cache_key]
+    incr("cache.snapshot.miss")
+    
+    with _key_lock(cache_key):
+        if cache_key in _snapshot_cache:
+            return _snapshot_cache[cache_key]
+        
+        try:
+            data = fetch_snapshot(category, date, provider)
+        except Exception as e:
+            incr("s3.errors")
+            # 오류는 캐시하지 않음 (다음 호출에서 재시도)
+            return {"error": str(e)}
+        
+        with span("rules.evaluate", category=category):
+            findings = evaluate_rules(category, data, provider)
+        _findings_cache[cache_key] = findings
+        _snapshot_cache[cache_key] = data
+        # 추이 조회가 같은 날짜를 다시 내려받지 않도록 집계도 함께 보관 (최신 날짜는 메모리에만)
+        dates = list_snapshot_dates(provider)
+        store_aggregate(category, date, compute_aggregate(category, data, provider, findings),
+                        provider, bool(dates) and date != dates[-1])
+    return data
+
+def load_snapshots(categories, date=None, provider=None):
+    """여러 제공자/카테고리 스냅샷을 병렬 로드 → ({(provider, category): data}, {provider: date})"""
+    providers = resolve_providers(provider)
+    dates = {p: date or get_latest_date(p) for p in providers}
+    keys = [(p, cat) for p in providers for cat in dict.fromkeys(categories)]
+    futures = {key: _loader_pool.submit(load_cmdb_data, key[1], dates[key[0]], key[0]) for key in keys}
+    return {key: future.result() for key, future in futures.items()}, dates
+
+# 준비 완료 신호 (워밍업을 요청한 경우 최신 스냅샷 로드 후 설정)
+_ready = threading.Event()
+
+def warm_up(provider=DEFAULT_PROVIDER):
+    """최신 스냅샷 전체 카테고리를 미리 로드 (거버넌스 점검 포함) 후 준비 완료 표시"""
     try:
-        response = s3_client.list_objects_v2(
-            Bucket=S3_BUCKET,
-            Prefix='aws-policies/',
-            Delimiter='/'
-        )
-        dates = [p['Prefix'].split('/')[-2] for p in response.get('CommonPrefixes', [])]
-        return max(dates) if dates else datetime.now().strftime('%Y%m%d')
-    except:
-        return datetime.now().strftime('%Y%m%d')
+        with span("startup.warm_up", provider=provider):
+            load_snapshots(CATEGORIES, None, provider)
+    except Exception as e:
+        incr("startup.warm_up_errors")
+        _write_metric({"event": "warm_up_failed", "error": str(e)})
+    finally:
+        _ready.set()
+
+def start_warm_up(provider=None):
+    """백그라운드 워밍업 시작 (provider가 없으면 즉시 준비 완료)"""
+    if not provider:
+        _ready.set()
+        return
+    threading.Thread(target=warm_up, args=(provider,), name="cmdb-warm-up", daemon=True).start()
+
+def _is_loaded(provider, category, date):
+    return (provider, category, date) in _snapshot_cache
+
+# ---------------------------------------------------------------------------
+# 거버넌스 점검 규칙
+# ---------------------------------------------------------------------------
+
+def _iter_resources(data):
+    """{account_id: {service: [resource, ...]}} 구조를 (account_id, service, resource)로 순회"""
+    if not isinstance(data, dict):
+        return
+    for account_id, account_data in data.items():
+        if account_id == 'error' or not isinstance(account_data, dict):
+            continue
+        for service_name, resources in account_data.items():
+            if isinstance(resources, list):
+                for resource in resources:
+                    if isinstance(resource, dict):
+                        yield account_id, service_name, resource
+
+def _resource_id(resource):
+    """리소스 식별자 추출 (ARN 우선)"""
+    for field in ('Arn', 'ARN', 'arn', 'KeyArn', 'RoleName', 'UserName', 'GroupName',
+                  'PolicyName', 'Name', 'BucketName', 'GroupId', 'InstanceId',
+                  'DBInstanceIdentifier', 'FunctionName', 'KeyId', 'Id'):
+        value = resource.get(field)
+        if value:
+            return str(value)
+    return json.dumps(resource, default=str)[:80]
+
+def _policy_statements(policy):
+    """정책 문서(문자열/딕셔너리)에서 Statement 리스트 추출"""
+    if isinstance(policy, str):
+        try:
+            policy = json.loads(policy)
+        except ValueError:
+            return []
+    if isinstance(policy, dict) and 'PolicyDocument' in policy:
+        return _policy_statements(policy['PolicyDocument'])
+    if not isinstance(policy, dict):
+        return []
+    statements = policy.get('Statement', [])
+    if isinstance(statements, dict):
+        statements = [statements]
+    return [stmt for stmt in statements if isinstance(stmt, dict)]
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _is_public_principal(principal):
+    if principal == '*':
+        return True
+    if isinstance(principal, dict):
+        return any(p == '*' for values in principal.values() for p in _as_list(values))
+    return False
+
+def _check_s3_public(resource):
+    """S3 버킷 공개 여부 (ACL AllUsers/AuthenticatedUsers, 정책 Principal '*', PolicyStatus)"""
+    status = resource.get('PolicyStatus')
+    if isinstance(status, dict) and status.get('IsPublic'):
+        return "PolicyStatus.IsPublic = true"
+    acl = resource.get('Acl') or resource.get('ACL') or {}
+    grants = acl.get('Grants', []) if isinstance(acl, dict) else _as_list(resource.get('Grants'))
+    for grant in grants:
+        uri = (grant.get('Grantee') or {}).get('URI', '') if isinstance(grant, dict) else ''
+        if uri.endswith('/AllUsers') or uri.endswith('/AuthenticatedUsers'):
+            return f"ACL grant: {uri.rsplit('/', 1)[-1]} ({grant.get('Permission')})"
+    for stmt in _policy_statements(resource.get('Policy') or resource.get('BucketPolicy')):
+        if (stmt.get('Effect') == 'Allow' and _is_public_principal(stmt.get('Principal'))
+                and not stmt.get('Condition')):
+            return f"Bucket policy allows Principal '*': {stmt.get('Action')}"
+    return None
+
+def _is_admin_statement(stmt):
+    return (stmt.get('Effect') == 'Allow' and '*' in _as_list(stmt.get('Action'))
+            and '*' in _as_list(stmt.get('Resource')))
+
+def _check_iam_admin(resource, managed_documents=None):
+    """AdministratorAccess 연결 또는 Action '*' / Resource '*' 허용 정책
+    
+    managed_documents(_managed_policy_documents)가 주어지면 연결된 고객 관리형 정책의 문서도 확인
+    """
+    managed_documents = managed_documents or {}
+    for policy in _as_list(resource.get('AttachedManagedPolicies')):
+        if not isinstance(policy, dict):
+            continue
+        if (policy.get('PolicyName') == 'AdministratorAccess'
+                or str(policy.get('PolicyArn', '')).endswith(':policy/AdministratorAccess')):
+            return "AdministratorAccess attached"
+        statements = managed_documents.get(policy.get('PolicyArn')) or managed_documents.get(policy.get('PolicyName'))
+        if any(_is_admin_statement(stmt) for stmt in statements or []):
+            return f"Managed policy '{policy.get('PolicyName')}' allows Action '*' on Resource '*'"
+    inline_policies = _as_list(resource.get('RolePolicyList') or resource.get('UserPolicyList')
+                               or resource.get('GroupPolicyList') or resource.get('InlinePolicies'))
+    for policy in inline_policies:
+        for stmt in _policy_statements(policy):
+            if _is_admin_statement(stmt):
+                name = policy.get('PolicyName', 'inline') if isinstance(policy, dict) else 'inline'
+                return f"Inline policy '{name}' allows Action '*' on Resource '*'"
+    return None
+
+def _check_kms_rotation(resource):
+    """고객 관리형 KMS 키의 자동 교체 비활성화"""
+    if resource.get('KeyManager', 'CUSTOMER') != 'CUSTOMER':
+        return None
+    if resource.get('KeyRotationEnabled') is False:
+        return "KeyRotationEnabled = false"
+    return None
+
+def _check_open_ingress(resource):
+    """0.0.0.0/0 또는 ::/0 인바운드 허용 보안그룹"""
+    for perm in _as_list(resource.get('IpPermissions')):
+        if not isinstance(perm, dict):
+            continue
+        open_cidrs = [r.get('CidrIp') for r in _as_list(perm.get('IpRanges'))
+                      if isinstance(r, dict) and r.get('CidrIp') == '0.0.0.0/0']
+        open_cidrs += [r.get('CidrIpv6') for r in _as_list(perm.get('Ipv6Ranges'))
+                       if isinstance(r, dict) and r.get('CidrIpv6') == '::/0']
+        if open_cidrs:
+            port = perm.get('FromPort', 'all')
+            if perm.get('ToPort') not in (None, port):
+                port = f"{port}-{perm.get('ToPort')}"
+            return f"{'/'.join(open_cidrs)} → {perm.get('IpProtocol')} port {port}"
+    return None
+
+def _check_db_public(resource):
+    if resource.get('PubliclyAccessible') is True:
+        return "PubliclyAccessible = true"
+    return None
+
+def _check_db_unencrypted(resource):
+    if resource.get('StorageEncrypted') is False:
+        return "StorageEncrypted = false"
+    return None
 
-def load_cmdb_data(category, date=None):
-    """S3에서 CMDB 데이터 로드"""
+def _check_secret_rotation(resource):
+    if resource.get('RotationEnabled') is False:
+        return "RotationEnabled = false"
+    return None
+
+def _check_ec2_public_ip(resource):
+    if resource.get('PublicIpAddress'):
+        return "PublicIpAddress assigned"
+    return None
+
+def _gcp_bindings(resource):
+    """GCP IAM 정책 bindings 추출 (리소스 자체 또는 iamPolicy 하위)"""
+    policy = resource.get('iamPolicy') or resource.get('policy') or resource
+    return [b for b in _as_list(policy.get('bindings') if isinstance(policy, dict) else None)
+            if isinstance(b, dict)]
+
+def _check_gcs_public(resource):
+    """allUsers/allAuthenticatedUsers에 권한이 부여된 GCS 버킷"""
+    for binding in _gcp_bindings(resource):
+        public = [m for m in _as_list(binding.get('members')) if m in ('allUsers', 'allAuthenticatedUsers')]
+        if public:
+            return f"{'/'.join(public)} → {binding.get('role')}"
+    return None
+
+def _check_gcp_primitive_role(resource):
+    """owner/editor 기본 역할이 부여된 주체"""
+    for binding in _gcp_bindings(resource):
+        if binding.get('role') in ('roles/owner', 'roles/editor'):
+            members = _as_list(binding.get('members'))
+            if members:
+                return f"{binding['role']} → {', '.join(members[:5])}"
+    return None
+
+def _check_gcp_firewall_open(resource):
+    """0.0.0.0/0 인바운드를 허용하는 VPC 방화벽 규칙"""
+    if resource.get('disabled') or resource.get('direction', 'INGRESS') != 'INGRESS':
+        return None
+    if '0.0.0.0/0' in _as_list(resource.get('sourceRanges')) and resource.get('allowed'):
+        ports = [f"{a.get('IPProtocol')}:{','.join(_as_list(a.get('ports'))) or 'all'}"
+                 for a in _as_list(resource.get('allowed')) if isinstance(a, dict)]
+        return f"0.0.0.0/0 → {' '.join(ports)}"
+    return None
+
+def _check_cloudsql_public(resource):
+    """0.0.0.0/0이 authorizedNetworks에 포함된 Cloud SQL 인스턴스"""
+    ip_config = (resource.get('settings') or {}).get('ipConfiguration') or {}
+    for network in _as_list(ip_config.get('authorizedNetworks')):
+        if isinstance(network, dict) and network.get('value') == '0.0.0.0/0':
+            return "authorizedNetworks includes 0.0.0.0/0"
+    return None
+
+# 규칙 정의: service_match는 서비스 키(소문자)에 포함되어야 하는 문자열
+# prepare(선택): 스냅샷 전체에서 한 번 계산해 check(resource, context)에 넘길 컨텍스트
+GOVERNANCE_RULES = [
+    {"provider": "aws", "rule_id": "s3_public_bucket", "category": "storage_policies", "service_match": ("s3",),
+     "severity": "high", "description": "퍼블릭 접근이 허용된 S3 버킷", "check": _check_s3_public},
+    {"provider": "aws", "rule_id": "iam_admin_access", "category": "identity_policies", "service_match": ("iam",),
+     "severity": "high", "description": "AdministratorAccess 또는 전체 권한(*:*)을 가진 IAM 주체",
+     "check": _check_iam_admin, "prepare": lambda data: _managed_policy_documents(data)},
+    {"provider": "aws", "rule_id": "kms_rotation_disabled", "category": "security_policies", "service_match": ("kms",),
+     "severity": "medium", "description": "자동 키 교체가 비활성화된 고객 관리형 KMS 키",
+     "check": _check_kms_rotation},
+    {"provider": "aws", "rule_id": "secret_rotation_disabled", "category": "security_policies",
+     "service_match": ("secret",), "severity": "medium",
+     "description": "자동 교체가 비활성화된 Secrets Manager 시크릿", "check": _check_secret_rotation},
+    {"provider": "aws", "rule_id": "sg_open_ingress", "category": "network_policies",
+     "service_match": ("security", "sg", "vpc", "ec2"), "severity": "high",
+     "description": "0.0.0.0/0 인바운드를 허용하는 보안그룹", "check": _check_open_ingress},
+    {"provider": "aws", "rule_id": "db_publicly_accessible", "category": "database_policies", "service_match": ("rds",),
+     "severity": "high", "description": "퍼블릭 접근이 가능한 RDS 인스턴스", "check": _check_db_public},
+    {"provider": "aws", "rule_id": "db_unencrypted", "category": "database_policies", "service_match": ("rds",),
+     "severity": "medium", "description": "스토리지 암호화가 비활성화된 RDS 인스턴스",
+     "check": _check_db_unencrypted},
+    {"provider": "aws", "rule_id": "ec2_public_ip", "category": "compute_policies", "service_match": ("ec2",),
+     "severity": "low", "description": "퍼블릭 IP가 할당된 EC2 인스턴스", "check": _check_ec2_public_ip},
+    {"provider": "gcp", "rule_id": "gcs_public_bucket", "category": "storage_policies",
+     "service_match": ("storage", "gcs", "bucket"), "severity": "high",
+     "description": "allUsers/allAuthenticatedUsers에 공개된 GCS 버킷", "check": _check_gcs_public},
+    {"provider": "gcp", "rule_id": "gcp_primitive_role", "category": "identity_policies",
+     "service_match": ("iam", "project", "polic"), "severity": "medium",
+     "description": "owner/editor 기본 역할이 부여된 GCP 주체", "check": _check_gcp_primitive_role},
+    {"provider": "gcp", "rule_id": "gcp_firewall_open_ingress", "category": "network_policies",
+     "service_match": ("firewall",), "severity": "high",
+     "description": "0.0.0.0/0 인바운드를 허용하는 GCP 방화벽 규칙", "check": _check_gcp_firewall_open},
+    {"provider": "gcp", "rule_id": "cloudsql_public", "category": "database_policies",
+     "service_match": ("sql",), "severity": "high",
+     "description": "0.0.0.0/0에 열린 Cloud SQL 인스턴스", "check": _check_cloudsql_public},
+]
+
+def _rules_version():
+    """규칙 정의와 check 코드의 해시 (규칙이 바뀌면 findings가 들어간 디스크 캐시를 새로 만들기 위함)"""
+    digest = hashlib.sha1()
+    for rule in GOVERNANCE_RULES:
+        digest.update(repr((rule['provider'], rule['rule_id'], rule['category'],
+                            rule['service_match'], rule['severity'])).encode())
+        for func in (rule['check'], rule.get('prepare')):
+            if func is not None:
+                _hash_code(digest, func.__code__)
+    return digest.hexdigest()[:12]
+
+def _hash_code(digest, code):
+    # 중첩 코드 객체의 repr에는 메모리 주소가 들어가므로 재귀로 내용만 반영
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _hash_code(digest, const)
+        else:
+            digest.update(repr(const).encode())
+
+RULES_VERSION = _rules_version()
+
+def evaluate_rules(category, data, provider=DEFAULT_PROVIDER):
+    """카테고리 스냅샷에 해당 규칙들을 한 번 적용해 findings 리스트 생성"""
+    rules = [rule for rule in GOVERNANCE_RULES
+             if rule['category'] == category and rule['provider'] == provider]
+    findings = []
+    if not rules:
+        return findings
+    # prepare가 있는 규칙은 스냅샷 단위 컨텍스트(예: 관리형 정책 문서)를 한 번 만들어 check에 전달
+    contexts = {rule['rule_id']: rule['prepare'](data) for rule in rules if 'prepare' in rule}
+    for account_id, service_name, resource in _iter_resources(data):
+        service_lower = service_name.lower()
+        for rule in rules:
+            if not any(match in service_lower for match in rule['service_match']):
+                continue
+            try:
+                if rule['rule_id'] in contexts:
+                    detail = rule['check'](resource, contexts[rule['rule_id']])
+                else:
+                    detail = rule['check'](resource)
+            except Exception:
+                continue
+            if detail:
+                findings.append({
+                    "provider": provider,
+                    "rule_id": rule['rule_id'],
+                    "severity": rule['severity'],
+                    "account_id": account_id,
+                    "service": service_name,
+                    "resource": _resource_id(resource),
+                    "detail": detail
+                })
+    return findings
+
+def get_findings(date=None, rule_id=None, account_id=None, service=None, severity=None, provider=None):
+    """캐시된 findings를 규칙/계정/서비스/심각도로 필터링"""
+    categories = CATEGORIES
+    if rule_id:
+        categories = [rule['category'] for rule in GOVERNANCE_RULES if rule['rule_id'] == rule_id]
+        if not categories:
+            return {"error": f"알 수 없는 rule_id: {rule_id}",
+                    "rules": [rule['rule_id'] for rule in GOVERNANCE_RULES]}
+    
+    snapshots, dates = load_snapshots(categories, date, provider)
+    results = []
+    errors = {}
+    for (prov, cat), data in snapshots.items():
+        if not _is_loaded(prov, cat, dates[prov]):
+            errors[f"{prov}/{cat}"] = data.get('error') if isinstance(data, dict) else str(data)
+            continue
+        for finding in _findings_cache.get((prov, cat, dates[prov]), []):
+            if rule_id and finding['rule_id'] != rule_id:
+                continue
+            if account_id and finding['account_id'] != account_id:
+                continue
+            if service and service.lower() not in finding['service'].lower():
+                continue
+            if severity and finding['severity'] != severity.lower():
+                continue
+            results.append(finding)
+    
+    counts = {}
+    for finding in results:
+        counts[finding['rule_id']] = counts.get(finding['rule_id'], 0) + 1
+    
+    response = {
+        "dates": dates,
+        "total": len(results),
+        "counts_by_rule": counts,
+        "rules": {rule['rule_id']: rule['description'] for rule in GOVERNANCE_RULES
+                  if rule['rule_id'] in counts},
+        "findings": results
+    }
+    if errors:
+        response["errors"] = errors
+    return response
+
+# ---------------------------------------------------------------------------
+# IAM 정책 평가 인덱스 (who_can)
+# ---------------------------------------------------------------------------
+
+# AWS 관리형 정책 중 문서가 스냅샷에 없을 수 있는 전체 권한 정책
+_BUILTIN_POLICY_STATEMENTS = {
+    'AdministratorAccess': [{"Effect": "Allow", "Action": "*", "Resource": "*"}],
+}
+
+_PRINCIPAL_FIELDS = (('RoleName', 'role'), ('UserName', 'user'), ('GroupName', 'group'))
+_INLINE_POLICY_FIELDS = ('RolePolicyList', 'UserPolicyList', 'GroupPolicyList', 'InlinePolicies')
+
+def _compile_pattern(pattern, ignore_case=False):
+    """IAM 와일드카드(*, ?) 패턴을 정규식으로 컴파일"""
+    regex = re.escape(str(pattern)).replace(r'\*', '.*').replace(r'\?', '.')
+    return re.compile(f"^{regex}$", re.IGNORECASE if ignore_case else 0)
+
+def _action_service(action):
+    """액션의 서비스 접두어 (인덱스 버킷 키)"""
+    prefix = str(action).split(':', 1)[0].lower()
+    return '*' if ('*' in prefix or '?' in prefix or ':' not in str(action)) else prefix
+
+def _managed_policy_documents(data):
+    """스냅샷의 관리형 정책(ARN/이름) → Statement 리스트"""
+    documents = {}
+    for _, _, resource in _iter_resources(data):
+        if not resource.get('PolicyName') or any(field in resource for field, _ in _PRINCIPAL_FIELDS):
+            continue
+        document = resource.get('Document') or resource.get('PolicyDocument')
+        for version in _as_list(resource.get('PolicyVersionList')):
+            if isinstance(version, dict) and version.get('IsDefaultVersion'):
+                document = version.get('Document')
+        statements = _policy_statements(document)
+        if statements:
+            documents[resource['PolicyName']] = statements
+            if resource.get('Arn'):
+                documents[resource['Arn']] = statements
+    return documents
+
+def build_iam_index(data):
+    """identity 스냅샷을 (서비스 → [컴파일된 action/resource 패턴, effect, 주체]) 인덱스로 변환"""
+    managed = _managed_policy_documents(data)
+    principals = []
+    group_members = {}
+    index = {}
+    
+    def add_statements(principal_idx, policy_name, statements):
+        for stmt in statements:
+            effect = stmt.get('Effect', 'Allow')
+            not_action = 'NotAction' in stmt
+            actions = _as_list(stmt.get('NotAction' if not_action else 'Action'))
+            not_resource = 'NotResource' in stmt
+            resources = _as_list(stmt.get('NotResource' if not_resource else 'Resource')) or ['*']
+            entry_resources = [_compile_pattern(r) for r in resources]
+            # NotAction은 서비스 범위를 특정할 수 없으므로 '*' 버킷에 둔다
+            buckets = {'*'} if not_action else {_action_service(a) for a in actions}
+            entry = {
+                "principal": principal_idx,
+                "policy": policy_name,
+                "effect": effect,
+                "actions": [_compile_pattern(a, ignore_case=True) for a in actions],
+                "not_action": not_action,
+                "resources": entry_resources,
+                "resource_patterns": [str(r) for r in resources],
+                "not_resource": not_resource,
+                "conditional": bool(stmt.get('Condition'))
+            }
+            for bucket in buckets:
+                index.setdefault(bucket, []).append(entry)
+    
+    for account_id, service_name, resource in _iter_resources(data):
+        for field, principal_type in _PRINCIPAL_FIELDS:
+            if not resource.get(field):
+                continue
+            principal_idx = len(principals)
+            principals.append({
+                "type": principal_type,
+                "name": resource[field],
+                "account_id": account_id,
+                "arn": resource.get('Arn', '')
+            })
+            if principal_type == 'user':
+                for group in _as_list(resource.get('GroupList')):
+                    group_members.setdefault((account_id, group), []).append(principal_idx)
+            for policy in _as_list(resource.get('AttachedManagedPolicies')):
+                if not isinstance(policy, dict):
+                    continue
+                name = policy.get('PolicyName', '')
+                statements = (managed.get(policy.get('PolicyArn')) or managed.get(name)
+                              or _BUILTIN_POLICY_STATEMENTS.get(name, []))
+                add_statements(principal_idx, name, statements)
+            for field_name in _INLINE_POLICY_FIELDS:
+                for policy in _as_list(resource.get(field_name)):
+                    name = policy.get('PolicyName', 'inline') if isinstance(policy, dict) else 'inline'
+                    add_statements(principal_idx, name, _policy_statements(policy))
+            break
+    
+    # 그룹 정책은 소속 사용자에게 상속
+    group_index = {(p['account_id'], p['name']): idx for idx, p in enumerate(principals)
+                   if p['type'] == 'group'}
+    inherited = {}
+    for key, members in group_members.items():
+        if key in group_index:
+            inherited[group_index[key]] = members
+    
+    return {"principals": principals, "index": index, "group_members": inherited}
+
+def _entry_matches(entry, action, resource):
+    """resource가 None이면 리소스 범위와 무관하게 액션만 비교"""
+    action_hit = any(p.match(action) for p in entry['actions'])
+    if entry['not_action']:
+        action_hit = not action_hit
+    if not action_hit:
+        return False
+    if resource is None:
+        return True
+    resource_hit = any(p.match(resource) for p in entry['resources'])
+    return not resource_hit if entry['not_resource'] else resource_hit
+
+def _entry_scopes(entry, resource):
+    """허용 범위 표시용 리소스 패턴 (NotResource는 접두어로 구분)"""
+    if entry['not_resource']:
+        return [f"NotResource:{pattern}" for pattern in entry['resource_patterns']]
+    if resource is None:
+        return entry['resource_patterns']
+    return [pattern for pattern, compiled in zip(entry['resource_patterns'], entry['resources'])
+            if compiled.match(resource)]
+
+def _entry_covers_all_resources(entry):
+    return not entry['not_resource'] and '*' in entry['resource_patterns']
+
+def who_can(action, resource=None, date=None, account_id=None):
+    """인덱스에서 action/resource를 허용받는 주체 조회 (명시적 Deny 반영, AWS IAM 전용)
+    
+    resource를 생략하면 어떤 리소스 범위로든 action을 허용받은 주체를 찾고, 허용 범위를
+    resource_scopes로 돌려준다. 이때 Deny는 모든 리소스(*)에 대한 것만 반영
+    """
     if not date:
-        date = get_latest_date()
+        date = get_latest_date('aws')
+    
+    iam_index = _iam_index_cache.get(date)
+    if iam_index is None:
+        with _key_lock(('iam', date)):
+            iam_index = _iam_index_cache.get(date)
+            if iam_index is None:
+                data = load_cmdb_data('identity_policies', date, 'aws')
+                if not _is_loaded('aws', 'identity_policies', date):
+                    return {"error": data.get('error')}
+                with span("index.iam.build", date=date):
+                    iam_index = build_iam_index(data)
+                _iam_index_cache[date] = iam_index
+    
+    principals = iam_index['principals']
+    candidates = iam_index['index'].get('*', []) + iam_index['index'].get(_action_service(action), [])
+    
+    allowed = {}
+    denied = set()
+    for entry in candidates:
+        if not _entry_matches(entry, action, resource):
+            continue
+        # 그룹에 연결된 정책은 그룹과 소속 사용자 모두에게 적용
+        targets = [entry['principal']] + iam_index['group_members'].get(entry['principal'], [])
+        for target in targets:
+            if entry['effect'] == 'Deny':
+                if not entry['conditional'] and (resource is not None or _entry_covers_all_resources(entry)):
+                    denied.add(target)
+            else:
+                allowed.setdefault(target, []).append({
+                    "policy": entry['policy'],
+                    "conditional": entry['conditional'],
+                    "scopes": _entry_scopes(entry, resource)
+                })
+    
+    results = []
+    for idx, grants in allowed.items():
+        if idx in denied:
+            continue
+        principal = principals[idx]
+        if account_id and principal['account_id'] != account_id:
+            continue
+        results.append({
+            **principal,
+            "via_policies": sorted({g['policy'] for g in grants}),
+            "resource_scopes": sorted({scope for g in grants for scope in g['scopes']}),
+            "conditional_only": all(g['conditional'] for g in grants)
+        })
+    results.sort(key=lambda p: (p['account_id'], p['type'], p['name']))
+    
+    return {
+        "date": date,
+        "action": action,
+        "resource": resource if resource is not None else "(모든 리소스 범위)",
+        "total": len(results),
+        "principals": results
+    }
+
+# ---------------------------------------------------------------------------
+# 카테고리 간 리소스 관계 그래프
+# ---------------------------------------------------------------------------
+
+# 리소스 자신을 가리키는 ARN 필드 (그 외 ARN 값은 참조로 취급)
+_OWN_ARN_FIELDS = ('Arn', 'ARN', 'arn', 'KeyArn', 'FunctionArn', 'DBInstanceArn', 'TopicArn',
+                   'QueueArn', 'TableArn', 'ClusterArn', 'SecretArn', 'BucketArn', 'selfLink')
+# 리소스 자신의 ID 필드 (우선순위 순서, 처음 발견된 하나만 소유)
+_OWN_ID_FIELDS = ('InstanceId', 'GroupId', 'SubnetId', 'NetworkInterfaceId', 'VolumeId',
+                  'VpcId', 'KeyId', 'DBInstanceIdentifier', 'FunctionName', 'RoleName',
+                  'UserName', 'GroupName', 'BucketName', 'email', 'Name', 'name')
+_REF_ID_PATTERN = re.compile(
+    r'^(vpc|subnet|sg|eni|igw|nat|rtb|vol|i|snap|ami|tgw|pcx|vpce)-[0-9a-f]{8,17}$')
+_REF_UUID_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+def _own_identifiers(service_name, resource):
+    """리소스가 소유한 식별자 (ARN + 대표 ID)"""
+    identifiers = [str(resource[f]) for f in _OWN_ARN_FIELDS if resource.get(f)]
+    for field in _OWN_ID_FIELDS:
+        if resource.get(field):
+            identifiers.append(str(resource[field]))
+            break
+    if 's3' in service_name.lower() and resource.get('Name'):
+        identifiers.append(f"arn:aws:s3:::{resource['Name']}")
+    return identifiers
+
+def _iter_references(value):
+    """리소스 값 전체에서 ARN/리소스 ID/UUID 형태의 문자열 추출"""
+    if isinstance(value, dict):
+        for v in value.values():
+            yield from _iter_references(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _iter_references(v)
+    elif isinstance(value, str):
+        if value.startswith('arn:aws'):
+            # 정책의 "arn:aws:s3:::bucket/*" → 버킷 ARN
+            yield value[:-2] if value.endswith('/*') else value
+        elif value.startswith('https://www.googleapis.com/'):
+            yield value
+        elif value.endswith('.gserviceaccount.com'):
+            # GCP 바인딩 멤버 "serviceAccount:sa@project.iam.gserviceaccount.com" → 이메일
+            yield value.split(':', 1)[-1]
+        elif _REF_ID_PATTERN.match(value) or _REF_UUID_PATTERN.match(value):
+            yield value
+
+def build_resource_graph(snapshots):
+    """카테고리별 스냅샷을 노드 리스트 + 인접 리스트(정수 인덱스)로 변환 (제공자 단위)"""
+    nodes = []
+    aliases = {}
+    resources = []
+    
+    # 1단계: 리소스 노드와 소유 식별자 등록
+    for category, data in snapshots.items():
+        for account_id, service_name, resource in _iter_resources(data):
+            node_idx = len(nodes)
+            nodes.append((_resource_id(resource), category, account_id, service_name))
+            for identifier in _own_identifiers(service_name, resource):
+                aliases.setdefault(identifier, node_idx)
+            resources.append((node_idx, resource))
     
-    key = f"aws-policies/{date}/{category}.json"
+    # 2단계: 참조 문자열로 간선 연결 (스냅샷에 없는 대상은 외부 노드로 추가)
+    adjacency = [set() for _ in nodes]
+    for node_idx, resource in resources:
+        for ref in _iter_references(resource):
+            if '*' in ref:
+                continue
+            target = aliases.get(ref)
+            if target is None:
+                if _REF_UUID_PATTERN.match(ref):
+                    continue
+                target = len(nodes)
+                nodes.append((ref, None, None, None))
+                adjacency.append(set())
+                aliases[ref] = target
+            if target != node_idx:
+                adjacency[node_idx].add(target)
+                adjacency[target].add(node_idx)
+    
+    return {
+        "nodes": nodes,
+        "aliases": aliases,
+        "adjacency": [tuple(sorted(edges)) for edges in adjacency]
+    }
+
+def _node_info(node):
+    resource_id, category, account_id, service_name = node
+    if category is None:
+        return {"id": resource_id, "external": True}
+    return {"id": resource_id, "category": category, "account_id": account_id, "service": service_name}
+
+def get_related_resources(resource, depth=1, date=None, provider=DEFAULT_PROVIDER, limit=200):
+    """그래프에서 리소스와 depth 홉 이내로 연결된 리소스 조회"""
+    if not date:
+        date = get_latest_date(provider)
+    depth = max(1, min(int(depth or 1), 4))
+    
+    graph = _graph_cache.get((provider, date))
+    if graph is None:
+        with _key_lock(('graph', provider, date)):
+            graph = _graph_cache.get((provider, date))
+            if graph is None:
+                loaded, _ = load_snapshots(CATEGORIES, date, provider)
+                with span("index.graph.build", provider=provider, date=date):
+                    graph = build_resource_graph({cat: data for (_, cat), data in loaded.items()})
+                # 일부 카테고리 로드 실패시 불완전한 그래프는 캐시하지 않음
+                if all(_is_loaded(provider, cat, date) for cat in CATEGORIES):
+                    _graph_cache[(provider, date)] = graph
+    
+    nodes = graph['nodes']
+    start = graph['aliases'].get(resource)
+    if start is None:
+        query = resource.lower()
+        candidates = [idx for idx, node in enumerate(nodes) if query in node[0].lower()]
+        if len(candidates) != 1:
+            return {
+                "error": f"리소스를 찾을 수 없거나 여러 개와 일치합니다: {resource}",
+                "candidates": [nodes[idx][0] for idx in candidates[:20]]
+            }
+        start = candidates[0]
+    
+    # BFS
+    visited = {start: (0, None)}
+    frontier = [start]
+    for level in range(1, depth + 1):
+        next_frontier = []
+        for node_idx in frontier:
+            for neighbor in graph['adjacency'][node_idx]:
+                if neighbor not in visited:
+                    visited[neighbor] = (level, node_idx)
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+    
+    related = []
+    for node_idx, (level, parent) in visited.items():
+        if node_idx == start:
+            continue
+        related.append({**_node_info(nodes[node_idx]), "depth": level, "via": nodes[parent][0]})
+    related.sort(key=lambda r: (r['depth'], r['id']))
+    
+    return {
+        "provider": provider,
+        "date": date,
+        "resource": _node_info(nodes[start]),
+        "depth": depth,
+        "total": len(related),
+        "truncated": len(related) > limit,
+        "related": related[:limit]
+    }
+
+# ---------------------------------------------------------------------------
+# 날짜별 리소스 추이
+# ---------------------------------------------------------------------------
+
+def compute_aggregate(category, data, provider=DEFAULT_PROVIDER, findings=None):
+    """스냅샷 하나의 경량 집계 (계정 수, 서비스별 리소스 수, 규칙별 findings 수)"""
+    accounts = 0
+    services = {}
+    if isinstance(data, dict):
+        for account_id, account_data in data.items():
+            if account_id == 'error' or not isinstance(account_data, dict):
+                continue
+            accounts += 1
+            for service_name, resources in account_data.items():
+                if isinstance(resources, list):
+                    services[service_name] = services.get(service_name, 0) + len(resources)
+    if findings is None:
+        findings = evaluate_rules(category, data, provider)
+    finding_counts = {}
+    for finding in findings:
+        finding_counts[finding['rule_id']] = finding_counts.get(finding['rule_id'], 0) + 1
+    return {"accounts": accounts, "services": services, "findings": finding_counts}
+
+def _aggregate_path(provider, category, date):
+    return os.path.join(CACHE_DIR, 'aggregates', f"rules-{RULES_VERSION}", provider, category, f"{date}.json")
+
+# 집계가 없는 날짜의 다운로드/파싱 전용 스레드 (공유 로더 풀을 점유하지 않고 동시 파싱 수 제한)
+_trend_pool = ThreadPoolExecutor(max_workers=TREND_MAX_PARSES, thread_name_prefix="cmdb-trend")
+
+def store_aggregate(category, date, aggregate, provider=DEFAULT_PROVIDER, persist=True):
+    """집계를 메모리에 보관하고, 과거 날짜(persist)면 로컬 디스크에도 기록"""
+    persisted = False
+    if persist:
+        path = _aggregate_path(provider, category, date)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(aggregate, f)
+            os.replace(tmp_path, path)
+            persisted = True
+        except OSError:
+            pass
+    _aggregate_cache[(provider, category, date)] = (time.time(), persisted, aggregate)
+
+def cached_aggregate(category, date, provider=DEFAULT_PROVIDER, persist=True):
+    """메모리 → 로컬 디스크 순서로 집계 조회 (없으면 None, 다운로드하지 않음)
+    
+    persist가 False인 최신 날짜 집계는 DATE_INDEX_TTL 동안만 사용하고, 최신이었던 날짜가
+    과거 날짜가 되면 메모리에 있던 집계를 그때 디스크에 기록
+    """
+    cache_key = (provider, category, date)
+    cached = _aggregate_cache.get(cache_key)
+    if cached:
+        stored_at, persisted, aggregate = cached
+        if persist and not persisted:
+            store_aggregate(category, date, aggregate, provider)
+        if persist or time.time() - stored_at < DATE_INDEX_TTL:
+            incr("cache.aggregate.hit")
+            return aggregate
+        return None
+    
+    if not persist:
+        return None
     try:
-        response = s3_client.get_object(Bucket=S3_BUCKET, Key=key)
-        data = json.loads(response['Body'].read().decode('utf-8'))
-        return data
+        with open(_aggregate_path(provider, category, date)) as f:
+            aggregate = json.load(f)
+    except (OSError, ValueError):
+        return None
+    incr("cache.aggregate.disk_hit")
+    _aggregate_cache[cache_key] = (time.time(), True, aggregate)
+    return aggregate
+
+def load_aggregate(category, date, provider=DEFAULT_PROVIDER, persist=True):
+    """집계 조회: 메모리 → 로컬 디스크 → (로드된 스냅샷 또는 S3 다운로드) 순서"""
+    aggregate = cached_aggregate(category, date, provider, persist)
+    if aggregate is not None:
+        return aggregate
+    
+    cache_key = (provider, category, date)
+    with _key_lock(('aggregate',) + cache_key):
+        aggregate = cached_aggregate(category, date, provider, persist)
+        if aggregate is not None:
+            return aggregate
+        
+        incr("cache.aggregate.miss")
+        if cache_key in _snapshot_cache:
+            aggregate = compute_aggregate(category, _snapshot_cache[cache_key], provider,
+                                          _findings_cache.get(cache_key))
+        else:
+            # 추이 조회용 과거 스냅샷은 집계만 남기고 원본은 캐시하지 않음
+            try:
+                data = fetch_snapshot(category, date, provider)
+            except Exception as e:
+                incr("s3.errors")
+                return {"error": str(e)}
+            aggregate = compute_aggregate(category, data, provider)
+            del data
+        store_aggregate(category, date, aggregate, provider, persist)
+    return aggregate
+
+def get_resource_trend(category, service=None, start=None, end=None, rule_id=None,
+                       provider=DEFAULT_PROVIDER):
+    """기간 내 날짜별 리소스 수 (service 또는 rule_id 기준) 추이"""
+    for value in (start, end):
+        if not value:
+            continue
+        try:
+            if not re.fullmatch(r'\d{8}', str(value)):
+                raise ValueError(value)
+            datetime.strptime(value, '%Y%m%d')
+        except ValueError:
+            return {"error": f"날짜 형식이 올바르지 않습니다 (YYYYMMDD): {value}"}
+    dates = list_snapshot_dates(provider)
+    if not dates:
+        return {"error": f"{provider} 스냅샷 날짜를 찾을 수 없습니다"}
+    end = end or dates[-1]
+    if not start:
+        start = (datetime.strptime(end, '%Y%m%d') - timedelta(days=TREND_DEFAULT_DAYS)).strftime('%Y%m%d')
+    selected = [d for d in dates if start <= d <= end]
+    
+    # 메모리/디스크에 있는 집계는 바로 사용하고, 없는 날짜만 전용 풀에서 다운로드
+    # 과거 스냅샷은 변경되지 않으므로 디스크에 영구 보관, 최신 날짜는 메모리에만 보관
+    aggregates = {d: cached_aggregate(category, d, provider, d != dates[-1]) for d in selected}
+    futures = {
+        d: _trend_pool.submit(load_aggregate, category, d, provider, d != dates[-1])
+        for d, aggregate in aggregates.items() if aggregate is None
+    }
+    
+    points = []
+    errors = {}
+    service_lower = service.lower() if service else None
+    for d in selected:
+        aggregate = futures[d].result() if d in futures else aggregates[d]
+        if 'error' in aggregate:
+            errors[d] = aggregate['error']
+            continue
+        if rule_id:
+            count = aggregate['findings'].get(rule_id, 0)
+        elif service_lower:
+            count = sum(n for name, n in aggregate['services'].items() if service_lower in name.lower())
+        else:
+            count = sum(aggregate['services'].values())
+        points.append({"date": d, "count": count, "accounts": aggregate['accounts']})
+    
+    result = {
+        "provider": provider,
+        "category": category,
+        "service": service,
+        "rule_id": rule_id,
+        "start": start,
+        "end": end,
+        "points": points
+    }
+    if len(points) >= 2:
+        result["change"] = points[-1]["count"] - points[0]["count"]
+    if errors:
+        result["errors"] = errors
+    return result
+
+# ---------------------------------------------------------------------------
+# SQL 조회 (DuckDB)
+# ---------------------------------------------------------------------------
+
+# 스키마 버전 (테이블 구성이 바뀌면 올려서 캐시된 DuckDB 파일을 새로 생성)
+SQL_SCHEMA_VERSION = 2
+# 행이 없어도 항상 만드는 테이블과 스키마
+SQL_FIXED_TABLES = {
+    "resources": {"category": "VARCHAR", "service": "VARCHAR", "account_id": "VARCHAR",
+                  "resource_id": "VARCHAR", "data": "JSON"},
+    "findings": {"provider": "VARCHAR", "rule_id": "VARCHAR", "severity": "VARCHAR", "account_id": "VARCHAR",
+                 "service": "VARCHAR", "resource": "VARCHAR", "detail": "VARCHAR"},
+}
+
+# 조회 전용으로 허용하는 문장 시작 키워드
+_SQL_READ_KEYWORDS = ('select', 'with', 'from', 'describe', 'show', 'summarize', 'explain', 'pivot', 'unpivot')
+
+def _duckdb():
+    """duckdb 모듈 (없으면 None)"""
+    try:
+        import duckdb
+        return duckdb
+    except ImportError:
+        return None
+
+def _sql_table_name(category, service_name):
+    """카테고리/서비스 → 테이블 이름 (예: identity_policies + IAM Roles → identity_iam_roles)"""
+    slug = re.sub(r'[^a-z0-9]+', '_', service_name.lower()).strip('_') or 'resources'
+    return f"{category.replace('_policies', '')}_{slug}"
+
+def _flatten_resource(account_id, resource):
+    """최상위 필드는 컬럼으로, 중첩 값은 JSON 문자열로"""
+    row = {"account_id": account_id, "resource_id": _resource_id(resource)}
+    seen = {key.lower() for key in row}
+    for key, value in resource.items():
+        if key.lower() in seen:
+            continue
+        seen.add(key.lower())
+        row[key] = json.dumps(value, default=str, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+    return row
+
+_sql_temp_dir = None
+
+def _remove_file(path):
+    if path:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+
+def _sql_temp_path(date, provider):
+    """최신 날짜 DuckDB 파일 경로 (프로세스 전용 임시 디렉터리, 종료시 삭제)"""
+    global _sql_temp_dir
+    with _load_locks_guard:
+        if _sql_temp_dir is None:
+            _sql_temp_dir = tempfile.mkdtemp(prefix='cmdb-sql-')
+            atexit.register(shutil.rmtree, _sql_temp_dir, True)
+    return os.path.join(_sql_temp_dir, f"{provider}-{date}-{time.time_ns()}.duckdb")
+
+def build_sql_database(date, provider=DEFAULT_PROVIDER, persist=True):
+    """스냅샷을 평탄화한 DuckDB 파일 생성 → 파일 경로
+    
+    persist면 캐시 디렉터리에 보관하고 재사용. 최신 날짜(persist=False)는 같은 날짜 폴더에
+    파일이 추가될 수 있으므로 임시 파일로 만들고, 과거 날짜가 된 뒤 다시 만들 때 보관
+    """
+    duckdb = _duckdb()
+    if persist:
+        # findings 테이블이 들어가므로 규칙 버전도 경로에 포함
+        path = os.path.join(CACHE_DIR, 'sql', f"v{SQL_SCHEMA_VERSION}-rules-{RULES_VERSION}", provider, f"{date}.duckdb")
+        if os.path.exists(path):
+            return path
+    else:
+        path = _sql_temp_path(date, provider)
+    
+    snapshots, _ = load_snapshots(CATEGORIES, date, provider)
+    failed = [cat for (_, cat) in snapshots if not _is_loaded(provider, cat, date)]
+    if failed:
+        raise RuntimeError(f"스냅샷 로드 실패: {', '.join(failed)}")
+    
+    tables = {"resources": [], "findings": []}
+    for (_, category), data in snapshots.items():
+        for account_id, service_name, resource in _iter_resources(data):
+            tables.setdefault(_sql_table_name(category, service_name), []).append(
+                _flatten_resource(account_id, resource))
+            tables["resources"].append({
+                "category": category,
+                "service": service_name,
+                "account_id": account_id,
+                "resource_id": _resource_id(resource),
+                "data": json.dumps(resource, default=str, ensure_ascii=False)
+            })
+        tables["findings"] += _findings_cache.get((provider, category, date), [])
+    
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(path))
+    tmp_path = os.path.join(work_dir, 'snapshot.duckdb')
+    try:
+        con = duckdb.connect(tmp_path)
+        try:
+            for table, columns in SQL_FIXED_TABLES.items():
+                con.execute(f'CREATE TABLE "{table}" ({", ".join(f"{c} {t}" for c, t in columns.items())})')
+            for table, rows in tables.items():
+                if not rows:
+                    continue
+                rows_path = os.path.join(work_dir, f"{table}.ndjson")
+                with open(rows_path, 'w') as f:
+                    for row in rows:
+                        f.write(json.dumps(row, default=str, ensure_ascii=False) + "\n")
+                source = (f"read_json('{rows_path.replace(chr(39), chr(39) * 2)}', "
+                          f"format='newline_delimited', sample_size=-1)")
+                if table in SQL_FIXED_TABLES:
+                    con.execute(f'INSERT INTO "{table}" BY NAME SELECT * FROM {source}')
+                else:
+                    con.execute(f'CREATE TABLE "{table}" AS SELECT * FROM {source}')
+        finally:
+            con.close()
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return path
+
+def _sql_connection(date, provider=DEFAULT_PROVIDER):
+    """스냅샷 DuckDB 읽기 전용 연결 (외부 파일 접근 차단, 설정 변경 잠금)"""
+    cache_key = (provider, date)
+    con = _sql_connection_cache.get(cache_key)
+    if con is not None:
+        return con
+    with _key_lock(('sql',) + cache_key):
+        con = _sql_connection_cache.get(cache_key)
+        if con is None:
+            dates = list_snapshot_dates(provider)
+            persist = bool(dates) and date != dates[-1]
+            with span("sql.build", provider=provider, date=date):
+                path = build_sql_database(date, provider, persist)
+            con = _duckdb().connect(path, read_only=True, config={
+                "enable_external_access": False,
+                "lock_configuration": True
+            })
+            if not persist:
+                _sql_temp_paths[cache_key] = path
+            _sql_connection_cache[cache_key] = con
+    return con
+
+def _check_read_only_sql(sql):
+    """단일 조회 문장인지 확인 → 정리된 SQL 또는 예외"""
+    statement = sql.strip().rstrip(';').strip()
+    # 문자열 리터럴을 제외하고 세미콜론(다중 문장) 검사
+    if ';' in re.sub(r"'(?:[^']|'')*'", "''", statement):
+        raise ValueError("한 번에 하나의 SELECT 문만 실행할 수 있습니다")
+    first_word = re.sub(r'^(\s|--[^\n]*\n|/\*.*?\*/)*', '', statement, flags=re.DOTALL).split(None, 1)
+    if not first_word or first_word[0].lower().strip('(') not in _SQL_READ_KEYWORDS:
+        raise ValueError(f"조회 문장만 허용됩니다 ({', '.join(_SQL_READ_KEYWORDS)})")
+    return statement
+
+def query_cmdb(sql=None, date=None, provider=DEFAULT_PROVIDER, limit=None):
+    """스냅샷 테이블에 읽기 전용 SQL 실행 (sql 생략시 테이블/컬럼 목록)"""
+    duckdb = _duckdb()
+    if duckdb is None:
+        return {"error": "query_cmdb에는 duckdb 패키지가 필요합니다 (pip install duckdb)"}
+    if not date:
+        date = get_latest_date(provider)
+    try:
+        limit = max(1, min(int(limit or SQL_ROW_LIMIT), SQL_ROW_LIMIT))
+    except (TypeError, ValueError):
+        return {"error": f"limit은 정수여야 합니다: {limit}"}
+    
+    if not sql:
+        sql = ("SELECT table_name, string_agg(column_name || ' ' || data_type, ', ' ORDER BY ordinal_position) "
+               "AS columns FROM information_schema.columns GROUP BY table_name ORDER BY table_name")
+        limit = SQL_ROW_LIMIT
+    try:
+        statement = _check_read_only_sql(sql)
+        con = _sql_connection(date, provider)
     except Exception as e:
         return {"error": str(e)}
+    
+    cursor = con.cursor()
+    # DuckDB에는 문장 타임아웃이 없으므로 타이머로 중단
+    timer = threading.Timer(SQL_TIMEOUT, cursor.interrupt)
+    timer.start()
+    try:
+        with span("sql.query", provider=provider, date=date):
+            cursor.execute(statement)
+            columns = [d[0] for d in cursor.description or []]
+            rows = cursor.fetchmany(limit + 1)
+    except duckdb.InterruptException:
+        return {"error": f"쿼리 시간 초과 ({SQL_TIMEOUT}초)"}
+    except duckdb.Error as e:
+        return {"error": str(e)}
+    finally:
+        timer.cancel()
+        cursor.close()
+    
+    return {
+        "provider": provider,
+        "date": date,
+        "columns": columns,
+        "rows": [list(row) for row in rows[:limit]],
+        "row_count": min(len(rows), limit),
+        "truncated": len(rows) > limit
+    }
+
+PROVIDER_PROPERTY = {"type": "string", "description": "클라우드 제공자 (aws/gcp/all), 생략시 aws"}
 
 @app.list_tools()
 async def list_tools() -> list[Tool]:
@@ -53,7 +1431,8 @@ async def list_tools() -> list[Tool]:
             inputSchema={
                 "type": "object",
                 "properties": {
-                    "date": {"type": "string", "description": "날짜 (YYYYMMDD), 생략시 최신"}
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD), 생략시 최신"},
+                    "provider": PROVIDER_PROPERTY
                 }
             }
         ),
@@ -63,7 +1442,8 @@ async def list_tools() -> list[Tool]:
             inputSchema={
                 "type": "object",
                 "properties": {
-                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"}
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"},
+                    "provider": PROVIDER_PROPERTY
                 }
             }
         ),
@@ -73,7 +1453,8 @@ async def list_tools() -> list[Tool]:
             inputSchema={
                 "type": "object",
                 "properties": {
-                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"}
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"},
+                    "provider": PROVIDER_PROPERTY
                 }
             }
         ),
@@ -83,7 +1464,8 @@ async def list_tools() -> list[Tool]:
             inputSchema={
                 "type": "object",
                 "properties": {
-                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"}
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"},
+                    "provider": PROVIDER_PROPERTY
                 }
             }
         ),
@@ -93,7 +1475,8 @@ async def list_tools() -> list[Tool]:
             inputSchema={
                 "type": "object",
                 "properties": {
-                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"}
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"},
+                    "provider": PROVIDER_PROPERTY
                 }
             }
         ),
@@ -103,7 +1486,8 @@ async def list_tools() -> list[Tool]:
             inputSchema={
                 "type": "object",
                 "properties": {
-                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"}
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"},
+                    "provider": PROVIDER_PROPERTY
                 }
             }
         ),
@@ -114,88 +1498,403 @@ async def list_tools() -> list[Tool]:
                 "type": "object",
                 "properties": {
                     "query": {"type": "string", "description": "검색어"},
-                    "category": {"type": "string", "description": "카테고리 (identity/storage/compute 등)"}
+                    "category": {"type": "string", "description": "카테고리 (identity/storage/compute 등)"},
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"},
+                    "provider": PROVIDER_PROPERTY
                 },
                 "required": ["query"]
             }
         ),
+        Tool(
+            name="get_findings",
+            description=("거버넌스 점검 결과 조회 (퍼블릭 S3 버킷, AdministratorAccess 역할, "
+                         "KMS 키 교체 미설정, 0.0.0.0/0 보안그룹 등). 규칙: "
+                         + ", ".join(rule['rule_id'] for rule in GOVERNANCE_RULES)),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "rule_id": {"type": "string", "description": "규칙 ID (생략시 전체)"},
+                    "account_id": {"type": "string", "description": "계정 ID"},
+                    "service": {"type": "string", "description": "서비스명 (예: S3, IAM, KMS)"},
+                    "severity": {"type": "string", "description": "심각도 (high/medium/low)"},
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"},
+                    "provider": PROVIDER_PROPERTY
+                }
+            }
+        ),
+        Tool(
+            name="who_can",
+            description=("특정 액션/리소스에 대한 권한을 가진 AWS IAM 주체(역할/사용자/그룹) 조회. "
+                         "와일드카드, 그룹 상속, 명시적 Deny 반영"),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "action": {"type": "string", "description": "IAM 액션 (예: s3:GetObject)"},
+                    "resource": {"type": "string", "description": "리소스 ARN (생략시 리소스 범위와 무관하게 조회)"},
+                    "account_id": {"type": "string", "description": "계정 ID"},
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"}
+                },
+                "required": ["action"]
+            }
+        ),
+        Tool(
+            name="get_related_resources",
+            description=("리소스와 연결된 리소스 조회 (ARN, VPC/서브넷/보안그룹 ID, KMS 키, IAM 역할 참조로 "
+                         "카테고리 간 연결된 그래프 탐색)"),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "resource": {"type": "string", "description": "리소스 ARN, ID 또는 이름"},
+                    "depth": {"type": "integer", "description": "탐색 깊이 (1-4, 기본 1)"},
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"},
+                    "provider": {"type": "string", "description": "클라우드 제공자 (aws/gcp), 생략시 aws"}
+                },
+                "required": ["resource"]
+            }
+        ),
+        Tool(
+            name="get_resource_trend",
+            description=("기간별 리소스 수 추이 (예: 최근 90일 IAM 역할 수, 퍼블릭 버킷 수, 보안그룹 수). "
+                         "날짜별 경량 집계를 디스크에 저장해 재사용. 집계가 없는 날짜는 처음 한 번 스냅샷을 "
+                         "내려받아 집계하므로 첫 조회는 느릴 수 있음"),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "category": {"type": "string", "description": "카테고리 (identity_policies 등)"},
+                    "service": {"type": "string", "description": "서비스명 (부분 일치, 생략시 카테고리 전체)"},
+                    "rule_id": {"type": "string", "description": "점검 규칙 ID (예: s3_public_bucket). 지정하면 findings 수 추이"},
+                    "start": {"type": "string", "description": "시작 날짜 (YYYYMMDD), 생략시 종료일 90일 전"},
+                    "end": {"type": "string", "description": "종료 날짜 (YYYYMMDD), 생략시 최신"},
+                    "provider": {"type": "string", "description": "클라우드 제공자 (aws/gcp), 생략시 aws"}
+                },
+                "required": ["category"]
+            }
+        ),
+        Tool(
+            name="query_cmdb",
+            description=("스냅샷에 읽기 전용 SQL(DuckDB) 실행. 집계/조인/Top-N 질문용. "
+                         "테이블: resources(category, service, account_id, resource_id, data JSON), "
+                         "findings(provider, rule_id, severity, account_id, service, resource, detail), "
+                         "서비스별 평탄화 테이블 {카테고리}_{서비스} (예: identity_iam, network_securitygroups; "
+                         "최상위 필드가 컬럼, 중첩 값은 JSON 문자열). sql 생략시 테이블/컬럼 목록 반환"),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "sql": {"type": "string", "description": "SELECT 문 (생략시 스키마 조회)"},
+                    "limit": {"type": "integer", "description": f"최대 행 수 (기본/최대 {SQL_ROW_LIMIT})"},
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"},
+                    "provider": {"type": "string", "description": "클라우드 제공자 (aws/gcp), 생략시 aws"}
+                }
+            }
+        ),
+        Tool(
+            name="get_server_stats",
+            description="MCP 서버 계측 정보 (구간별 지연 시간, S3 전송량, 캐시 히트율, 응답 크기, 대기열)",
+            inputSchema={
+                "type": "object",
+                "properties": {}
+            }
+        ),
         Tool(
             name="get_resource_summary",
             description="전체 리소스 요약 통계",
             inputSchema={
                 "type": "object",
                 "properties": {
-                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"}
+                    "date": {"type": "string", "description": "날짜 (YYYYMMDD)"},
+                    "provider": PROVIDER_PROPERTY
                 }
             }
         )
     ]
 
+def load_category(category, date=None, provider=None):
+    """카테고리 조회 도구용 로드 (provider=all이면 제공자별로 병렬 로드해서 합침)
+    
+    provider=all이면 계정 키를 "{provider}/{account_id}"로 바꿔서 단일 제공자와 같은
+    계정 → 서비스 → 리소스 목록 구조를 유지하고, 로드 실패는 errors에 모음
+    """
+    providers = resolve_providers(provider)
+    if len(providers) == 1:
+        return load_cmdb_data(category, date, providers[0])
+    snapshots, dates = load_snapshots([category], date, provider)
+    merged, errors = {}, {}
+    for (prov, _), data in snapshots.items():
+        if not _is_loaded(prov, category, dates[prov]):
+            errors[prov] = data.get('error')
+            continue
+        for account_id, account_data in data.items():
+            merged[f"{prov}/{account_id}"] = account_data
+    if errors:
+        merged["errors"] = errors
+    return merged
+
+def get_resource_summary(date=None, provider=None):
+    """제공자/카테고리별 요약 (provider=all이면 제공자 합계 포함)"""
+    snapshots, dates = load_snapshots(CATEGORIES, date, provider)
+    by_provider = {}
+    for (prov, cat), data in snapshots.items():
+        if _is_loaded(prov, cat, dates[prov]):
+            by_provider.setdefault(prov, {})[cat] = {
+                "total_accounts": len(data.keys()) if isinstance(data, dict) else 0,
+                "total_resources": sum(len(resources) for account_data in data.values() if isinstance(account_data, dict)
+                                       for resources in account_data.values() if isinstance(resources, list)),
+                "data_size": len(json.dumps(data))
+            }
+        else:
+            by_provider.setdefault(prov, {})[cat] = {"total_accounts": 0, "total_resources": 0, "data_size": 0,
+                                                     "error": data.get('error')}
+    if len(by_provider) == 1:
+        return next(iter(by_provider.values()))
+    
+    merged = {}
+    for summary in by_provider.values():
+        for cat, stats in summary.items():
+            total = merged.setdefault(cat, {"total_accounts": 0, "total_resources": 0, "data_size": 0})
+            total["total_accounts"] += stats["total_accounts"]
+            total["total_resources"] += stats["total_resources"]
+            total["data_size"] += stats["data_size"]
+    return {"dates": dates, "providers": by_provider, "merged": merged}
+
+# 도구 실행 슬롯 (S3 로드/인덱스 구축은 스레드에서 실행해 이벤트 루프를 막지 않음)
+_tool_slots = None
+_queued_tools = 0
+_running_tools = 0
+
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
-    """도구 실행"""
+    """도구 실행 (동시 실행 수 제한, 초과 요청은 대기열에서 대기)"""
+    global _tool_slots, _queued_tools, _running_tools
+    if _tool_slots is None:
+        _tool_slots = asyncio.Semaphore(MAX_CONCURRENT_TOOLS)
+    if _queued_tools >= MAX_QUEUED_TOOLS:
+        return [TextContent(type="text", text=json.dumps(
+            {"error": f"서버 요청 대기열이 가득 찼습니다 ({MAX_QUEUED_TOOLS}). 잠시 후 다시 시도하세요"},
+            ensure_ascii=False))]
+    
+    _queued_tools += 1
+    try:
+        with span("tool.queue_wait"):
+            await _tool_slots.acquire()
+    finally:
+        _queued_tools -= 1
+    _running_tools += 1
+    try:
+        with span(f"tool.{name}"):
+            result = await asyncio.to_thread(run_tool, name, arguments or {})
+        response_bytes = sum(len(content.text.encode('utf-8')) for content in result)
+        incr(f"tool.{name}.calls")
+        incr(f"tool.{name}.response_bytes", response_bytes)
+        _write_metric({"tool": name, "response_bytes": response_bytes})
+        return result
+    finally:
+        _running_tools -= 1
+        _tool_slots.release()
+
+def run_tool(name, arguments):
+    """도구 실행 본체 (동기)"""
     date = arguments.get('date')
+    provider = arguments.get('provider')
+    
+    try:
+        resolve_providers(provider)
+    except ValueError as e:
+        return [TextContent(type="text", text=json.dumps({"error": str(e)}, ensure_ascii=False))]
     
     if name == "get_identity_policies":
-        data = load_cmdb_data("identity_policies", date)
+        data = load_category("identity_policies", date, provider)
         return [TextContent(type="text", text=json.dumps(data, indent=2, default=str))]
     
     elif name == "get_storage_policies":
-        data = load_cmdb_data("storage_policies", date)
+        data = load_category("storage_policies", date, provider)
         return [TextContent(type="text", text=json.dumps(data, indent=2, default=str))]
     
     elif name == "get_compute_policies":
-        data = load_cmdb_data("compute_policies", date)
+        data = load_category("compute_policies", date, provider)
         return [TextContent(type="text", text=json.dumps(data, indent=2, default=str))]
     
     elif name == "get_database_policies":
-        data = load_cmdb_data("database_policies", date)
+        data = load_category("database_policies", date, provider)
         return [TextContent(type="text", text=json.dumps(data, indent=2, default=str))]
     
     elif name == "get_network_policies":
-        data = load_cmdb_data("network_policies", date)
+        data = load_category("network_policies", date, provider)
         return [TextContent(type="text", text=json.dumps(data, indent=2, default=str))]
     
     elif name == "get_security_policies":
-        data = load_cmdb_data("security_policies", date)
+        data = load_category("security_policies", date, provider)
         return [TextContent(type="text", text=json.dumps(data, indent=2, default=str))]
     
     elif name == "search_resources":
         query = arguments.get('query', '').lower()
         category = arguments.get('category', 'all')
         
-        categories = ['identity_policies', 'storage_policies', 'compute_policies', 
-                     'database_policies', 'network_policies', 'security_policies']
+        categories = CATEGORIES
         
         if category != 'all':
             categories = [f"{category}_policies"]
         
+        snapshots, _ = load_snapshots(categories, date, provider)
+        multi_provider = len(resolve_providers(provider)) > 1
         results = []
-        for cat in categories:
-            data = load_cmdb_data(cat, date)
+        for (prov, cat), data in snapshots.items():
             # 간단한 검색 로직
             if query in json.dumps(data).lower():
-                results.append({cat: data})
+                results.append({f"{prov}/{cat}" if multi_provider else cat: data})
         
         return [TextContent(type="text", text=json.dumps(results, indent=2, default=str))]
     
+    elif name == "get_findings":
+        result = get_findings(
+            date=date,
+            rule_id=arguments.get('rule_id'),
+            account_id=arguments.get('account_id'),
+            service=arguments.get('service'),
+            severity=arguments.get('severity'),
+            provider=provider
+        )
+        return [TextContent(type="text", text=json.dumps(result, indent=2, default=str, ensure_ascii=False))]
+    
+    elif name == "who_can":
+        result = who_can(
+            arguments.get('action', ''),
+            resource=arguments.get('resource') or None,
+            date=date,
+            account_id=arguments.get('account_id')
+        )
+        return [TextContent(type="text", text=json.dumps(result, indent=2, default=str, ensure_ascii=False))]
+    
+    elif name == "get_related_resources":
+        # 관계 그래프는 제공자 단위로 구성되므로 all은 기본 제공자로 처리
+        graph_provider = provider if provider in PROVIDERS else DEFAULT_PROVIDER
+        result = get_related_resources(
+            arguments.get('resource', ''),
+            depth=arguments.get('depth', 1),
+            date=date,
+            provider=graph_provider
+        )
+        return [TextContent(type="text", text=json.dumps(result, indent=2, default=str, ensure_ascii=False))]
+    
+    elif name == "get_resource_trend":
+        category = arguments.get('category', '')
+        if not category.endswith('_policies'):
+            category = f"{category}_policies"
+        if category not in CATEGORIES:
+            return [TextContent(type="text", text=json.dumps(
+                {"error": f"알 수 없는 카테고리: {category}", "categories": CATEGORIES}, ensure_ascii=False))]
+        service = arguments.get('service')
+        rule_id = arguments.get('rule_id')
+        # service 자리에 규칙 ID가 온 경우 findings 추이로 처리
+        if service and not rule_id and service in {rule['rule_id'] for rule in GOVERNANCE_RULES}:
+            service, rule_id = None, service
+        result = get_resource_trend(
+            category,
+            service=service,
+            start=arguments.get('start'),
+            end=arguments.get('end'),
+            rule_id=rule_id,
+            provider=provider if provider in PROVIDERS else DEFAULT_PROVIDER
+        )
+        return [TextContent(type="text", text=json.dumps(result, indent=2, default=str, ensure_ascii=False))]
+    
+    elif name == "query_cmdb":
+        result = query_cmdb(
+            arguments.get('sql'),
+            date=date,
+            provider=provider if provider in PROVIDERS else DEFAULT_PROVIDER,
+            limit=arguments.get('limit')
+        )
+        return [TextContent(type="text", text=json.dumps(result, indent=2, default=str, ensure_ascii=False))]
+    
+    elif name == "get_server_stats":
+        return [TextContent(type="text", text=json.dumps(get_server_stats(), indent=2, ensure_ascii=False))]
+    
     elif name == "get_resource_summary":
-        summary = {}
-        categories = ['identity_policies', 'storage_policies', 'compute_policies', 
-                     'database_policies', 'network_policies', 'security_policies']
-        
-        for cat in categories:
-            data = load_cmdb_data(cat, date)
-            summary[cat] = {
-                "total_accounts": len(data.keys()) if isinstance(data, dict) else 0,
-                "data_size": len(json.dumps(data))
-            }
-        
+        summary = get_resource_summary(date, provider)
         return [TextContent(type="text", text=json.dumps(summary, indent=2))]
     
     return [TextContent(type="text", text="Unknown tool")]
 
+class ConnectionLimiter:
+    """동시 HTTP 연결 수 제한 ASGI 미들웨어 (SSE 스트림은 연결이 유지되는 동안 1개로 계산)"""
+    def __init__(self, asgi_app, max_connections):
+        self.asgi_app = asgi_app
+        self.max_connections = max_connections
+        self.active = 0
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.asgi_app(scope, receive, send)
+        if self.active >= self.max_connections:
+            body = json.dumps({"error": "too many connections"}).encode()
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1")]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        self.active += 1
+        try:
+            await self.asgi_app(scope, receive, send)
+        finally:
+            self.active -= 1
+
+def create_http_app(max_connections=MAX_CONNECTIONS):
+    """Streamable HTTP(/mcp)와 SSE(/sse, /messages/) 엔드포인트를 제공하는 ASGI 앱"""
+    import contextlib
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, Response
+    from starlette.routing import Mount, Route
+    from mcp.server.sse import SseServerTransport
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    
+    session_manager = StreamableHTTPSessionManager(app=app, event_store=None, stateless=False)
+    sse = SseServerTransport("/messages/")
+    
+    class StreamableHTTPEndpoint:
+        """ASGI 앱 (함수로 넘기면 Route가 Request 핸들러로 감싸므로 호출 가능한 객체로 전달)"""
+        async def __call__(self, scope, receive, send):
+            await session_manager.handle_request(scope, receive, send)
+    
+    handle_streamable_http = StreamableHTTPEndpoint()
+    
+    async def handle_metrics(request):
+        return JSONResponse(get_server_stats())
+    
+    async def handle_health(request):
+        return JSONResponse({"status": "ok"})
+    
+    async def handle_ready(request):
+        # 워밍업이 끝나기 전까지는 503
+        if _ready.is_set():
+            return JSONResponse({"status": "ready"})
+        return JSONResponse({"status": "warming"}, status_code=503)
+    
+    async def handle_sse(request):
+        async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+            await app.run(read_stream, write_stream, app.create_initialization_options())
+        return Response()
+    
+    @contextlib.asynccontextmanager
+    async def lifespan(_):
+        async with session_manager.run():
+            yield
+    
+    starlette_app = Starlette(
+        routes=[
+            # /mcp와 /mcp/ 모두 리다이렉트(307) 없이 처리
+            Route("/mcp", endpoint=handle_streamable_http),
+            Mount("/mcp", app=handle_streamable_http),
+            Route("/sse", endpoint=handle_sse, methods=["GET"]),
+            Route("/metrics", endpoint=handle_metrics, methods=["GET"]),
+            Route("/health", endpoint=handle_health, methods=["GET"]),
+            Route("/ready", endpoint=handle_ready, methods=["GET"]),
+            Mount("/messages/", app=sse.handle_post_message),
+        ],
+        lifespan=lifespan
+    )
+    return ConnectionLimiter(starlette_app, max_connections)
+
 async def main():
+    import mcp.server.stdio
     async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
         await app.run(
             read_stream,
@@ -203,6 +1902,23 @@ async def main():
             app.create_initialization_options()
         )
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="CMDB MCP 서버")
+    parser.add_argument("--transport", choices=["stdio", "http"], default="stdio",
+                        help="stdio: 클라이언트별 프로세스, http: 여러 클라이언트가 공유하는 Streamable HTTP/SSE 서버")
+    parser.add_argument("--host", default=os.getenv('CMDB_MCP_HOST', '127.0.0.1'))
+    parser.add_argument("--port", type=int, default=int(os.getenv('CMDB_MCP_PORT', '8765')))
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("--warm", nargs="?", const=DEFAULT_PROVIDER, default=os.getenv('CMDB_MCP_WARM'),
+                        choices=list(PROVIDERS) + ['all'],
+                        help="시작 직후 최신 스냅샷을 미리 로드 (HTTP 모드는 완료 후 /ready가 200 응답)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
+    args = parse_args()
+    start_warm_up(args.warm)
+    if args.transport == "http":
+        import uvicorn
+        uvicorn.run(create_http_app(args.max_connections), host=args.host, port=args.port)
+    else:
+        asyncio.run(main())
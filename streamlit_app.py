@@ -9,12 +9,37 @@ import os
 from dotenv import load_dotenv
 import subprocess
 import asyncio
+import gzip
+import bisect
+import heapq
+from functools import lru_cache
+import time
+import threading
+from contextlib import closing, contextmanager
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
 
 # 환경 변수 로드
 load_dotenv()
 
+# 턴 단위 계측 로그 파일 (JSON lines). 설정하지 않으면 채팅 탭 패널에만 표시
+METRICS_LOG = os.getenv('CMDB_METRICS_LOG')
+
+# 세션 작업 집합 크기: 재사용할 도구 결과 수, 프롬프트에 넣을 이전 대화 수/답변 길이
+WORKING_SET_MAX_TOOLS = int(os.getenv('CMDB_WORKING_SET_MAX_TOOLS', '12'))
+WORKING_SET_MAX_TURNS = 5
+WORKING_SET_ANSWER_CHARS = 500
+# 작업 집합의 스냅샷 확인용 최신 날짜 캐시 시간 (초)
+WORKING_SET_DATE_TTL = 60
+# 키워드 필터링 후 도구 결과마다 남길 최대 리소스 수 (점수 상위)
+FILTER_MAX_RESOURCES = int(os.getenv('CMDB_FILTER_MAX_RESOURCES', '300'))
+# 모든 세션이 공유하는 필터링 색인(ResourceIndex) 수
+SHARED_INDEX_MAX = int(os.getenv('CMDB_SHARED_INDEX_MAX', '32'))
+
+# 외부 공유 MCP 서버 주소 (예: http://host:8765/mcp). 설정하면 로컬 서버를 띄우지 않음
+MCP_SERVER_URL = os.getenv('CMDB_MCP_URL')
+
 # AWS Bedrock 설정
 bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
 s3_client = boto3.client('s3')
@@ -30,12 +55,21 @@ st.set_page_config(
 st.sidebar.title("🔍 CMDB 설정")
 S3_BUCKET = st.sidebar.text_input("S3 버킷", value="mwaa-cmdb-bucket")
 
-def get_latest_date():
+# 클라우드 제공자별 S3 prefix (mcp_server.PROVIDERS와 동일)
+PROVIDERS = {
+    'aws': 'aws-policies',
+    'gcp': 'gcp-policies',
+}
+CLOUD_PROVIDER = st.sidebar.selectbox("클라우드", ["aws", "gcp", "all"])
+# 스냅샷 파일 확장자 우선순위 (압축본이 있으면 우선 사용, .json.zst는 zstandard 설치시)
+SNAPSHOT_SUFFIXES = ('.json.zst', '.json.gz', '.json')
+
+def get_latest_date(provider='aws'):
     """S3에서 가장 최근 날짜 폴더 찾기"""
     try:
         response = s3_client.list_objects_v2(
             Bucket=S3_BUCKET,
-            Prefix='aws-policies/',
+            Prefix=f"{PROVIDERS[provider]}/",
             Delimiter='/'
         )
         dates = [p['Prefix'].split('/')[-2] for p in response.get('CommonPrefixes', [])]
@@ -162,15 +196,49 @@ def anonymize_data(data):
         # 익명화 실패시 원본 데이터 반환
         return data
 
-def load_cmdb_data(category, date=None, anonymize=True):
+@st.cache_data(ttl=300, show_spinner=False)
+def list_date_files(bucket, folder):
+    """날짜 폴더 안의 파일명 목록 (폴더당 LIST 한 번, 5분 캐시)"""
+    try:
+        response = s3_client.list_objects_v2(Bucket=bucket, Prefix=folder, Delimiter='/')
+        return sorted(obj['Key'][len(folder):] for obj in response.get('Contents', []))
+    except Exception:
+        return []
+
+def read_snapshot(base_key):
+    """{base_key}.json.zst / .json.gz / .json 중 존재하는 첫 객체를 스트리밍 압축 해제해서 파싱
+    
+    어떤 변형이 있는지는 날짜 폴더 LIST로 확인 (변형마다 GET을 시도하지 않음)
+    """
+    folder, name = base_key.rsplit('/', 1)
+    files = set(list_date_files(S3_BUCKET, folder + '/'))
+    suffix = '.json'
+    for candidate in SNAPSHOT_SUFFIXES:
+        if candidate == '.json.zst':
+            try:
+                import zstandard
+            except ImportError:
+                continue
+        if name + candidate in files:
+            suffix = candidate
+            break
+    
+    response = s3_client.get_object(Bucket=S3_BUCKET, Key=base_key + suffix)
+    body = response['Body']
+    if suffix == '.json.gz':
+        body = gzip.GzipFile(fileobj=body)
+    elif suffix == '.json.zst':
+        body = zstandard.ZstdDecompressor().stream_reader(body)
+    with closing(body):
+        return json.load(body)
+
+def load_cmdb_data(category, date=None, anonymize=True, provider='aws'):
     """S3에서 CMDB 데이터 로드 (선택적 익명화)"""
     if not date:
-        date = get_latest_date()
+        date = get_latest_date(provider)
     
-    key = f"aws-policies/{date}/{category}.json"
     try:
-        response = s3_client.get_object(Bucket=S3_BUCKET, Key=key)
-        data = json.loads(response['Body'].read().decode('utf-8'))
+        data = read_snapshot(f"{PROVIDERS[provider]}/{date}/{category}")
         # 익명화 선택적 적용
         if anonymize:
             return anonymize_data(data)
@@ -179,51 +247,108 @@ def load_cmdb_data(category, date=None, anonymize=True):
     except Exception as e:
         return {"error": str(e)}
 
-# MCP 서버 자동 시작
+# MCP 서버 자동 시작 (HTTP 모드로 한 번 띄우고 모든 세션이 공유)
+MCP_SERVER_PORT = int(os.getenv('CMDB_MCP_PORT', '8765'))
+MCP_LOCAL_URL = f"http://127.0.0.1:{MCP_SERVER_PORT}"
+# 서버 프로세스가 요청을 받을 수 있을 때까지(/health) 기다리는 시간
+MCP_STARTUP_TIMEOUT = float(os.getenv('CMDB_MCP_STARTUP_TIMEOUT', '30'))
+
+def check_mcp_server(base_url, path="/health"):
+    """/health(요청 처리 가능) 또는 /ready(워밍업 완료) 엔드포인트 확인"""
+    import urllib.request
+    try:
+        with urllib.request.urlopen(f"{base_url}{path}", timeout=0.5) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
 @st.cache_resource
 def start_mcp_server():
-    """MCP 서버 자동 시작"""
-    import subprocess
-    import time
-    import psutil
-    
-    # 이미 실행 중인 MCP 서버 확인
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-        try:
-            if 'mcp_server.py' in ' '.join(proc.info['cmdline'] or []):
-                st.success(f"✅ MCP 서버가 이미 실행 중입니다 (PID: {proc.info['pid']})")
-                return proc.info['pid']
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
+    """MCP 서버 자동 시작 (기다리지 않고 바로 반환, 연결 가능 여부는 wait_for_mcp_server에서 확인)"""
+    import sys
+    
+    # 이미 떠 있는 서버가 있으면 그대로 사용 (워밍업 중이어도 연결 가능)
+    if check_mcp_server(MCP_LOCAL_URL):
+        return {"url": MCP_LOCAL_URL, "process": None}
     
-    # MCP 서버 시작
     try:
         process = subprocess.Popen(
-            ['python', 'mcp_server.py'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            [sys.executable, 'mcp_server.py', '--transport', 'http',
+             '--port', str(MCP_SERVER_PORT), '--warm', CLOUD_PROVIDER],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
         )
-        time.sleep(2)  # 서버 시작 대기
-        
-        if process.poll() is None:  # 프로세스가 살아있음
-            st.success(f"✅ MCP 서버 시작됨 (PID: {process.pid})")
-            return process.pid
-        else:
-            st.error("❌ MCP 서버 시작 실패")
-            return None
+        return {"url": MCP_LOCAL_URL, "process": process}
     except Exception as e:
         st.error(f"❌ MCP 서버 시작 오류: {e}")
         return None
 
-# MCP 클라이언트 설정
+def wait_for_mcp_server(server, timeout=MCP_STARTUP_TIMEOUT):
+    """서버가 /health에 200을 응답할 때까지 대기 (timeout=0이면 한 번만 확인)
+    
+    워밍업(--warm) 완료까지 기다리지 않음. 워밍업 중에 들어온 도구 호출은 서버에서
+    같은 스냅샷 로드를 기다렸다가 결과를 공유하므로 첫 질문이 전체 워밍업에 묶이지 않음
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if check_mcp_server(server["url"]):
+            return True
+        if server["process"] is not None and server["process"].poll() is not None:
+            return False  # 프로세스 종료 (포트 충돌 등)
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+
 @st.cache_resource
+def mcp_connection_state():
+    """프로세스 전체에서 공유하는 연결 상태 (연결된 URL, 최초 대기 여부)"""
+    return {"url": None, "waited": False}
+
+def reset_mcp_server(check_health=True):
+    """자동 시작한 공유 서버가 종료됐으면 연결 상태를 지우고 True (다음 get_mcp_client에서 다시 시작)
+    
+    직접 띄운 프로세스는 종료 여부(poll)로, 이미 떠 있던 서버에 붙은 경우는 /health로 확인.
+    check_health가 False면 /health 요청 없이 프로세스 종료 여부만 확인
+    """
+    server = start_mcp_server()
+    process = server["process"] if server else None
+    if process is not None:
+        down = process.poll() is not None
+    else:
+        down = check_health and not check_mcp_server(MCP_LOCAL_URL)
+    if down:
+        state = mcp_connection_state()
+        state["url"] = None
+        state["waited"] = False
+        start_mcp_server.clear()
+    return down
+
+# MCP 클라이언트 설정
 def get_mcp_client():
-    """MCP 서버 클라이언트 초기화"""
-    # MCP 서버 자동 시작
-    server_pid = start_mcp_server()
-    if not server_pid:
-        return None
+    """MCP 서버 클라이언트 (HTTP URL 또는 stdio 파라미터)
+    
+    공유 서버 연결에 성공한 경우만 기억하고, 실패해서 stdio로 대체한 경우는 다음 호출에서
+    서버 상태를 다시 확인 (처음 한 번만 MCP_STARTUP_TIMEOUT까지 대기)
+    """
+    if MCP_SERVER_URL:
+        return MCP_SERVER_URL
     
+    # 미리 띄운 서버에 연결
+    state = mcp_connection_state()
+    if state["url"] and not reset_mcp_server(check_health=False):
+        return state["url"]
+    server = start_mcp_server()
+    if server:
+        timeout = 0 if state["waited"] else MCP_STARTUP_TIMEOUT
+        state["waited"] = True
+        if wait_for_mcp_server(server, timeout):
+            state["url"] = f"{server['url']}/mcp"
+            pid = server["process"].pid if server["process"] else None
+            st.success(f"✅ MCP 서버 연결 ({server['url']}" + (f", PID: {pid})" if pid else ")"))
+            return state["url"]
+    
+    # 실패시 요청마다 stdio 프로세스를 띄우는 기존 방식으로 동작
+    st.warning("⚠️ 공유 MCP 서버를 사용할 수 없어 stdio 모드로 연결합니다")
     try:
         server_params = StdioServerParameters(
             command="python",
@@ -235,46 +360,122 @@ def get_mcp_client():
         st.error(f"MCP 서버 연결 실패: {e}")
         return None
 
-async def call_mcp_tool_async(tool_name, **kwargs):
+def new_turn_metrics():
+    """채팅 한 턴의 구간별 시간/크기/토큰 기록"""
+    return {"spans": [], "sizes": {}, "tokens": {}}
+
+def record_span(metrics, name, start):
+    """start(perf_counter) 이후 경과 시간을 metrics에 기록"""
+    if metrics is not None:
+        metrics["spans"].append({"name": name, "ms": round((time.perf_counter() - start) * 1000, 1)})
+
+@contextmanager
+def timed(metrics, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(metrics, name, start)
+
+def record_usage(metrics, name, result):
+    """Bedrock 응답의 usage(입력/출력 토큰) 기록"""
+    usage = result.get('usage') if isinstance(result, dict) else None
+    if metrics is not None and usage:
+        metrics["tokens"][name] = {
+            "input": usage.get('input_tokens', 0),
+            "output": usage.get('output_tokens', 0)
+        }
+
+def write_turn_metrics(metrics):
+    """계측 로그 파일에 턴 기록 추가"""
+    if not METRICS_LOG:
+        return
+    try:
+        with open(METRICS_LOG, 'a') as f:
+            f.write(json.dumps({"ts": round(time.time(), 3), **metrics}, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+async def call_mcp_tool_http_async(url, tool_name, metrics=None, **kwargs):
+    """공유 HTTP MCP 서버 도구 호출"""
+    try:
+        start = time.perf_counter()
+        async with streamablehttp_client(url) as (read, write, _):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                record_span(metrics, f"mcp.connect:{tool_name}", start)
+                start = time.perf_counter()
+                result = await session.call_tool(tool_name, kwargs)
+                record_span(metrics, f"mcp.call:{tool_name}", start)
+                return result.content[0].text if result.content else {"error": "응답 없음"}
+    except Exception as e:
+        return {"error": str(e)}
+
+async def call_mcp_tool_async(tool_name, metrics=None, **kwargs):
     """실제 MCP 서버 도구 호출"""
     server_params = get_mcp_client()
     if not server_params:
         return {"error": "MCP 서버 연결 실패"}
+    if isinstance(server_params, str):
+        result = await call_mcp_tool_http_async(server_params, tool_name, metrics, **kwargs)
+        if not (isinstance(result, dict) and "error" in result) or MCP_SERVER_URL or not reset_mcp_server():
+            return result
+        # 자동 시작한 공유 서버가 종료된 경우 다시 띄우고(또는 stdio로 대체) 한 번 재시도
+        server_params = get_mcp_client()
+        if not server_params:
+            return result
+        if isinstance(server_params, str):
+            return await call_mcp_tool_http_async(server_params, tool_name, metrics, **kwargs)
     
     try:
+        # 프로세스 생성 + initialize
+        start = time.perf_counter()
         async with stdio_client(server_params) as (read, write):
             async with ClientSession(read, write) as session:
                 await session.initialize()
+                record_span(metrics, f"mcp.connect:{tool_name}", start)
                 
                 # 도구 호출
+                start = time.perf_counter()
                 result = await session.call_tool(tool_name, kwargs)
+                record_span(metrics, f"mcp.call:{tool_name}", start)
                 return result.content[0].text if result.content else {"error": "응답 없음"}
     except Exception as e:
         return {"error": str(e)}
 
-def call_mcp_tool(tool_name, **kwargs):
+def call_mcp_tool(tool_name, metrics=None, **kwargs):
     """동기 래퍼 함수"""
     try:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(call_mcp_tool_async(tool_name, **kwargs))
+        result = loop.run_until_complete(call_mcp_tool_async(tool_name, metrics, **kwargs))
         loop.close()
         
         # JSON 문자열인 경우 파싱
         if isinstance(result, str):
+            if metrics is not None:
+                metrics["sizes"][f"{tool_name}.response_bytes"] = len(result.encode('utf-8'))
             try:
-                return json.loads(result)
+                with timed(metrics, f"mcp.parse:{tool_name}"):
+                    return json.loads(result)
             except json.JSONDecodeError:
                 return {"error": f"JSON 파싱 실패: {result}"}
         return result
     except Exception as e:
         return {"error": str(e)}
 
-def select_mcp_tools(prompt):
-    """Bedrock이 필요한 MCP 도구 선택"""
+def select_mcp_tools(prompt, metrics=None, working_set=None):
+    """Bedrock이 필요한 MCP 도구 선택 (working_set이 있으면 이전 질문과 조회한 도구를 함께 전달)"""
+    history = ""
+    if working_set and working_set["turns"]:
+        previous = "\n".join(f"- {turn['prompt']} → {', '.join(turn['tools'])}" for turn in working_set["turns"])
+        history = f"""
+이전 질문과 사용한 도구 (후속 질문이면 같은 도구를 다시 선택하고, 새로 필요한 도구만 추가하세요):
+{previous}
+"""
     tool_selection_prompt = f"""
 질문: {prompt}
-
+{history}
 다음 CMDB 도구 중 필요한 것들을 선택하세요:
 
 - get_identity_policies: IAM 사용자, 역할, 그룹, 정책, 권한 관련
@@ -301,9 +502,36 @@ def select_mcp_tools(prompt):
 - get_resource_summary: 전체 리소스 개수 및 요약
   예: "전체 현황", "리소스 수", "요약"
 
+- get_findings: 사전 계산된 거버넌스 점검 결과 (퍼블릭 S3 버킷, AdministratorAccess 역할, KMS 키 교체 미설정, 0.0.0.0/0 보안그룹, 퍼블릭 RDS 등)
+  예: "퍼블릭 버킷", "관리자 권한을 가진 역할", "키 교체가 안 된 KMS 키", "열려있는 보안그룹"
+
+- who_can(액션 리소스ARN): 특정 작업을 할 수 있는 IAM 주체 조회 (정책 문서를 인덱스로 평가)
+  예: "이 버킷을 읽을 수 있는 역할은?" → who_can(s3:GetObject arn:aws:s3:::버킷명/*)
+      "EC2를 생성할 수 있는 사용자는?" → who_can(ec2:RunInstances)
+  괄호 안에 IAM 액션과 (알 수 있으면) 리소스 ARN을 공백으로 구분해서 적으세요
+
+- get_resource_trend(카테고리 서비스): 최근 90일간 리소스 수 추이
+  예: "최근 IAM 역할 수 변화" → get_resource_trend(identity IAM)
+      "퍼블릭 버킷 수 추이" → get_resource_trend(storage s3_public_bucket)
+  서비스 자리에 점검 규칙 ID(get_findings 규칙)를 적으면 점검 결과 수 추이
+
+- get_related_resources(리소스 깊이): 리소스와 연결된 다른 카테고리 리소스 (VPC/서브넷/보안그룹, KMS 키, IAM 역할 등)
+  예: "이 Lambda가 사용하는 역할과 보안그룹은?" → get_related_resources(함수명 1)
+      "이 버킷과 연결된 리소스 전부" → get_related_resources(버킷명 2)
+
+- query_cmdb(SQL): 스냅샷에 읽기 전용 SQL(DuckDB) 실행. 개수/순위/조인 등 집계 질문용
+  테이블: resources(category, service, account_id, resource_id, data JSON),
+          findings(rule_id, severity, account_id, service, resource, detail),
+          서비스별 테이블 {{카테고리}}_{{서비스}} (예: identity_iam_roles; 최상위 필드가 컬럼)
+  예: "역할이 가장 많은 계정 5개" → query_cmdb(SELECT account_id, count(*) n FROM resources WHERE service ILIKE '%role%' GROUP BY 1 ORDER BY n DESC LIMIT 5)
+      "규칙별 점검 결과 수" → query_cmdb(SELECT rule_id, count(*) FROM findings GROUP BY 1)
+
 중요: 
+- 퍼블릭 여부, 관리자 권한, 암호화/키 교체 등 보안 점검 질문은 get_findings 우선 선택
+- "누가 ~할 수 있나", "~ 권한을 가진 주체" 질문은 who_can 선택
 - "권한", "역할", "정책", "사용자" 관련 질문은 반드시 get_identity_policies 선택
 - CloudWatch, S3, EC2 등 서비스 권한 질문도 get_identity_policies 선택
+- "가장 많은", "몇 개", "계정별" 같은 집계 질문은 query_cmdb 선택
 - 여러 도구가 필요하면 모두 선택
 
 필요한 도구들을 콤마로 구분해서 답하세요. 예: get_identity_policies,get_storage_policies
@@ -313,7 +541,7 @@ def select_mcp_tools(prompt):
     try:
         body = json.dumps({
             "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 100,
+            "max_tokens": 300,
             "messages": [
                 {
                     "role": "user",
@@ -328,88 +556,379 @@ def select_mcp_tools(prompt):
         )
         
         result = json.loads(response['body'].read())
+        record_usage(metrics, "select_mcp_tools", result)
         tools_text = result['content'][0]['text'].strip()
         
-        # 콤마로 분리하여 도구 목록 생성
-        tools = [tool.strip() for tool in tools_text.split(',') if tool.strip()]
-        return tools
+        # 콤마로 분리하여 도구 목록 생성 (괄호 안 SQL의 콤마는 유지)
+        tools, depth, current = [], 0, ""
+        for ch in tools_text:
+            depth += {'(': 1, ')': -1}.get(ch, 0)
+            if ch == ',' and depth <= 0:
+                tools.append(current.strip())
+                current = ""
+            else:
+                current += ch
+        tools.append(current.strip())
+        return [tool for tool in tools if tool]
     
     except Exception as e:
         # 오류 시 기본 도구 반환
         return ["get_resource_summary"]
 
-def query_bedrock_with_mcp_tools(prompt):
-    """MCP 도구를 활용한 Bedrock 질의"""
+@st.cache_data(ttl=WORKING_SET_DATE_TTL, show_spinner=False)
+def cached_latest_date(bucket, provider):
+    """최신 날짜 폴더 (짧은 TTL 캐시, 조회 실패는 예외로 올려서 캐시하지 않음)"""
+    response = s3_client.list_objects_v2(Bucket=bucket, Prefix=f"{PROVIDERS[provider]}/", Delimiter='/')
+    dates = [p['Prefix'].split('/')[-2] for p in response.get('CommonPrefixes', [])]
+    return max(dates) if dates else None
+
+def get_working_set():
+    """현재 세션의 작업 집합 (버킷/클라우드/최신 스냅샷이 바뀌면 새로 시작)"""
+    providers = list(PROVIDERS) if CLOUD_PROVIDER == 'all' else [CLOUD_PROVIDER]
+    try:
+        latest = tuple(cached_latest_date(S3_BUCKET, p) for p in providers)
+    except Exception:
+        # 조회 실패시 기존 작업 집합 유지
+        working_set = st.session_state.get("working_set")
+        latest = working_set["snapshot"][2] if working_set else None
+    snapshot = (S3_BUCKET, CLOUD_PROVIDER, latest)
+    working_set = st.session_state.get("working_set")
+    if working_set is None or working_set["snapshot"] != snapshot:
+        working_set = {
+            "snapshot": snapshot,
+            "dates": {p: d for p, d in zip(providers, latest or ()) if d},  # 제공자 -> 조회할 날짜
+            "tool_results": {},  # 도구 호출 키 -> 결과
+            "slices": {},        # (도구 호출 키, 키워드) -> 필터링 결과
+            "indexes": {},       # 도구 호출 키 -> ResourceIndex (shared_resource_indexes의 항목 참조)
+            "turns": []          # 최근 질문/답변 요약
+        }
+        st.session_state.working_set = working_set
+    return working_set
+
+def remember(cache, key, value, max_size):
+    """크기 제한이 있는 dict에 저장 (가장 오래된 항목부터 제거)"""
+    cache.pop(key, None)
+    cache[key] = value
+    while len(cache) > max_size:
+        cache.pop(next(iter(cache)))
+
+def with_date(kwargs, date, key="date"):
+    """조회할 날짜가 정해져 있으면 도구 인자에 추가 (작업 집합과 서버가 같은 스냅샷을 보도록)"""
+    if date:
+        kwargs[key] = date
+    return kwargs
+
+def resolve_tool_call(tool, prompt, dates=None):
+    """선택된 도구 문자열 → (컨텍스트 키, MCP 도구 이름, 인자), 인자가 부족하면 None
+    
+    dates(제공자 -> 날짜)가 주어지면 해당 날짜를 인자에 넣는다. 도구는 날짜를 하나만 받으므로
+    provider가 all이면 날짜 없이 호출 (제공자별 최신 날짜)
+    """
+    dates = dates or {}
+    single_provider = CLOUD_PROVIDER if CLOUD_PROVIDER != 'all' else 'aws'
+    match = re.search(r'\((.*)\)', tool, re.DOTALL)
+    args = match.group(1).split() if match else []
+    
+    if "search_resources" in tool:
+        # 검색 쿼리 추출
+        search_query = prompt.split()
+        query = " ".join([word for word in search_query if len(word) > 2])[:50]
+        return tool, "search_resources", with_date({"query": query, "provider": CLOUD_PROVIDER},
+                                                   dates.get(CLOUD_PROVIDER))
+    elif tool.startswith("who_can"):
+        # who_can(액션 리소스ARN) 형식에서 인자 추출
+        if args:
+            who_can_args = {"action": args[0]}
+            if len(args) > 1:
+                who_can_args["resource"] = args[1]
+            return tool, "who_can", with_date(who_can_args, dates.get('aws'))
+    elif tool.startswith("get_resource_trend"):
+        if args:
+            trend_args = {"category": args[0], "provider": single_provider}
+            if len(args) > 1:
+                trend_args["service"] = args[1]
+            return tool, "get_resource_trend", with_date(trend_args, dates.get(single_provider), "end")
+    elif tool.startswith("get_related_resources"):
+        if args:
+            depth = int(args[1]) if len(args) > 1 and args[1].isdigit() else 1
+            return tool, "get_related_resources", with_date({"resource": args[0], "depth": depth, "provider": single_provider},
+                                                            dates.get(single_provider))
+    elif tool.startswith("query_cmdb"):
+        # query_cmdb(SQL) 형식에서 SQL 추출
+        if match and match.group(1).strip():
+            return "query_cmdb", "query_cmdb", with_date({"sql": match.group(1).strip(), "provider": single_provider},
+                                                         dates.get(single_provider))
+    else:
+        return tool, tool, with_date({"provider": CLOUD_PROVIDER}, dates.get(CLOUD_PROVIDER))
+    return None
+
+# 질문 키워드 추출: 따옴표로 감싼 구절, 또는 영문/숫자로 된 이름·ID·ARN 토큰
+_KEYWORD_PATTERN = re.compile(r'"([^"]+)"|\'([^\']+)\'|`([^`]+)`|([A-Za-z0-9][A-Za-z0-9_.:/@*+=-]*[A-Za-z0-9*])')
+# 3자 미만이어도 키워드로 쓰는 서비스명
+SHORT_SERVICE_KEYWORDS = {'s3', 'ec2', 'rds', 'vpc', 'iam', 'kms', 'sns', 'sqs', 'ecs', 'eks', 'efs', 'waf', 'gcs', 'gke'}
+# 거의 모든 리소스에 들어 있거나 의미 없는 단어
+KEYWORD_STOPWORDS = {'aws', 'gcp', 'arn', 'the', 'and', 'for', 'with', 'all', 'any', 'list', 'show', 'what',
+                     'which', 'who', 'how', 'many', 'count', 'are', 'has', 'have', 'can', 'not', 'cmdb'}
+# 필드별 점수: 이름/ID/ARN > 태그/라벨 > 그 외 (정책 문서 등)
+FIELD_WEIGHTS = ((re.compile(r'(name|id|arn|email|selflink)$'), 5), (re.compile(r'^(tags|labels)$'), 3))
+
+def extract_keywords(prompt):
+    """질문에서 필터링용 키워드(서비스명, 리소스 이름/ID, 따옴표 구절)를 소문자로 추출"""
+    keywords = []
+    for match in _KEYWORD_PATTERN.finditer(prompt):
+        quoted = next((g for g in match.groups()[:3] if g), None)
+        token = (quoted or match.group(4)).strip().lower()
+        if quoted is None and (token in KEYWORD_STOPWORDS or (len(token) < 3 and token not in SHORT_SERVICE_KEYWORDS)):
+            continue
+        if token and token not in keywords:
+            keywords.append(token)
+    return keywords[:20]
+
+class KeywordMatcher:
+    """질문 키워드 집합을 색인 텍스트에서 찾는 매처
+    
+    키워드는 20개 이하라서 Aho-Corasick 오토마톤(pyahocorasick)이나 정규식 alternation보다
+    미리 소문자로 만든 텍스트에 키워드별 str.find를 돌리는 쪽이 훨씬 빠름 (C 수준 부분 문자열 검색).
+    리소스의 줄은 가중치가 높은 필드부터 나오므로 리소스에서 처음 매치된 줄이 최고 점수이고,
+    나머지 줄은 건너뛰고 다음 리소스부터 계속 검색
+    """
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+    
+    def iter(self, index):
+        """ResourceIndex에서 (리소스 번호, 가중치, 키워드 번호) 순회 (리소스/키워드 조합당 한 번)"""
+        text, line_starts = index.text, index.line_starts
+        for i, keyword in enumerate(self.keywords):
+            pos = text.find(keyword)
+            while pos != -1:
+                line = bisect.bisect_right(line_starts, pos) - 1
+                resource = index.line_owner[line]
+                yield resource, index.line_weight[line], i
+                if resource + 1 >= index.resource_count:
+                    break
+                pos = text.find(keyword, index.resource_starts[resource + 1])
+
+class ResourceIndex:
+    """도구 결과(계정 → 서비스 → 리소스 목록)를 미리 소문자로 직렬화한 필터링용 색인
+    
+    리소스마다 이름/ID/ARN 필드, 태그/라벨, 리소스 전체 JSON을 각각 한 줄로 만들어 하나의 문자열로
+    이어 붙이고, 줄 시작 위치로 매치가 어느 리소스의 어떤 필드인지 찾음. 도구 결과(스냅샷)마다 한 번만 생성
+    """
+    def __init__(self, tool_data):
+        lines, self.line_starts, self.line_owner, self.line_weight = [], [], [], []
+        self.resource_starts = []
+        self._offset = 0
+        self.resource_count = 0
+        for resources in self._resource_lists(tool_data):
+            for resource in resources:
+                self.resource_starts.append(self._offset)
+                if isinstance(resource, dict):
+                    names, tags = [], []
+                    for key, value in resource.items():
+                        weight = self._field_weight(key)
+                        if weight == 5 and isinstance(value, (str, int)):
+                            names.append(str(value))
+                        elif weight == 3:
+                            tags.append(json.dumps(value, default=str, ensure_ascii=False))
+                    self._add_line(lines, " ".join(names), 5)
+                    self._add_line(lines, " ".join(tags), 3)
+                self._add_line(lines, json.dumps(resource, default=str, ensure_ascii=False), 1)
+                self.resource_count += 1
+        self.text = "\n".join(lines)
+    
+    def _add_line(self, lines, line, weight):
+        if not line:
+            return
+        line = line.replace("\n", " ").lower()
+        lines.append(line)
+        self.line_starts.append(self._offset)
+        self.line_owner.append(self.resource_count)
+        self.line_weight.append(weight)
+        self._offset += len(line) + 1
+    
+    @staticmethod
+    def _resource_lists(tool_data):
+        """필터링 대상 리소스 목록을 filter_tool_data와 같은 순서로 순회"""
+        if not isinstance(tool_data, dict):
+            return
+        for account_data in tool_data.values():
+            if isinstance(account_data, dict):
+                for resources in account_data.values():
+                    if isinstance(resources, list):
+                        yield resources
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _field_weight(key):
+        key = str(key).lower()
+        for pattern, weight in FIELD_WEIGHTS:
+            if pattern.search(key):
+                return weight
+        return 1
+    
+    def score(self, matcher):
+        """리소스 번호 -> 점수 (키워드마다 매치된 필드 중 가장 높은 가중치의 합)"""
+        scores = {}
+        for resource, weight, _ in matcher.iter(self):
+            scores[resource] = scores.get(resource, 0) + weight
+        return scores
+
+@st.cache_resource
+def shared_resource_indexes():
+    """프로세스 전체에서 공유하는 ResourceIndex 캐시: (도구 호출 키, 스냅샷) -> 색인"""
+    return {"lock": threading.Lock(), "indexes": {}}
+
+def get_resource_index(key, tool_data, metrics=None):
+    """공유 캐시에서 색인을 찾고, 없으면 만들어서 보관 (세션마다 같은 도구 결과를 다시 색인하지 않음)"""
+    shared = shared_resource_indexes()
+    with shared["lock"]:
+        index = shared["indexes"].get(key)
+        if index is not None:
+            remember(shared["indexes"], key, index, SHARED_INDEX_MAX)
+    # 같은 키라도 결과 구조가 다르면(스냅샷 재수집 등) 새로 색인
+    if index is not None and index.resource_count == sum(len(r) for r in ResourceIndex._resource_lists(tool_data)):
+        return index
+    with timed(metrics, "filter.index"):
+        index = ResourceIndex(tool_data)
+    with shared["lock"]:
+        remember(shared["indexes"], key, index, SHARED_INDEX_MAX)
+    return index
+
+def filter_tool_data(tool_data, matcher, index=None):
+    """계정 → 서비스 → 리소스 목록 구조에서 키워드가 매치된 리소스만 점수순으로 남김
+    
+    매치된 리소스가 많으면 점수 상위 FILTER_MAX_RESOURCES개만 남기고, 남는 것이 없으면 None
+    """
+    if not isinstance(tool_data, dict):
+        return tool_data
+    if index is None:
+        index = ResourceIndex(tool_data)
+    scores = index.score(matcher)
+    if len(scores) > FILTER_MAX_RESOURCES:
+        keep = set(heapq.nlargest(FILTER_MAX_RESOURCES, scores, key=scores.get))
+        scores = {i: s for i, s in scores.items() if i in keep}
+    
+    position = 0
+    filtered_accounts = {}
+    for account_id, account_data in tool_data.items():
+        if isinstance(account_data, dict):
+            filtered_services = {}
+            for service_name, resources in account_data.items():
+                if isinstance(resources, list):
+                    matched = [(scores[position + i], i, resource) for i, resource in enumerate(resources)
+                               if position + i in scores]
+                    position += len(resources)
+                    if matched:
+                        matched.sort(key=lambda m: (-m[0], m[1]))
+                        filtered_services[service_name] = [resource for _, _, resource in matched]
+                else:
+                    filtered_services[service_name] = resources
+            if filtered_services:
+                filtered_accounts[account_id] = filtered_services
+        else:
+            filtered_accounts[account_id] = account_data
+    return filtered_accounts or None
+
+def query_bedrock_with_mcp_tools(prompt, metrics=None, working_set=None):
+    """MCP 도구를 활용한 Bedrock 질의 (metrics가 주어지면 구간별 시간/크기/토큰 기록)
+    
+    working_set(get_working_set)이 주어지면 같은 스냅샷에서 이미 조회한 도구 결과와
+    필터링 결과를 재사용하고, 새로 필요한 도구만 호출하며, 이전 대화를 프롬프트에 포함
+    """
     try:
         # 1. 필요한 MCP 도구 선택
-        selected_tools = select_mcp_tools(prompt)
+        with timed(metrics, "select_mcp_tools"):
+            selected_tools = select_mcp_tools(prompt, metrics, working_set)
         
-        # 2. 선택된 도구들로 데이터 수집
+        # 2. 선택된 도구들로 데이터 수집 (작업 집합에 있으면 재사용)
         context_data = {}
+        call_keys = {}
+        reused_tools = []
         for tool in selected_tools:
-            if "search_resources" in tool:
-                # 검색 쿼리 추출
-                search_query = prompt.split()
-                query = " ".join([word for word in search_query if len(word) > 2])[:50]
-                context_data[tool] = call_mcp_tool(tool, query=query)
-            else:
-                context_data[tool] = call_mcp_tool(tool)
+            call = resolve_tool_call(tool, prompt, working_set["dates"] if working_set else None)
+            if call is None:
+                continue
+            context_key, tool_name, kwargs = call
+            call_key = f"{tool_name}:{json.dumps(kwargs, sort_keys=True, ensure_ascii=False)}"
+            if working_set and "date" not in kwargs and "end" not in kwargs:
+                # 날짜 없이 호출하는 경우(provider all 등)는 제공자별 날짜를 키에 포함
+                call_key += f"@{json.dumps(working_set['dates'], sort_keys=True)}"
+            call_keys[context_key] = call_key
+            if working_set is not None and call_key in working_set["tool_results"]:
+                context_data[context_key] = working_set["tool_results"][call_key]
+                reused_tools.append(context_key)
+                continue
+            
+            tool_start = time.perf_counter()
+            result = call_mcp_tool(tool_name, metrics, **kwargs)
+            record_span(metrics, f"tool:{tool}", tool_start)
+            context_data[context_key] = result
+            if working_set is not None and not (isinstance(result, dict) and "error" in result):
+                remember(working_set["tool_results"], call_key, result, WORKING_SET_MAX_TOOLS)
         
         # 3. 질문에서 키워드 추출 (필터링용)
-        keywords = []
-        prompt_lower = prompt.lower()
-        # 서비스명 키워드
-        service_keywords = ['cloudwatch', 's3', 'ec2', 'rds', 'lambda', 'dynamodb', 
-                           'vpc', 'iam', 'kms', 'sns', 'sqs', 'ecs', 'eks']
-        for keyword in service_keywords:
-            if keyword in prompt_lower:
-                keywords.append(keyword)
+        keywords = extract_keywords(prompt)
         
-        # 4. 데이터 필터링 (키워드가 있으면)
+        # 4. 데이터 필터링 (키워드가 있으면, 같은 도구/키워드 조합은 재사용)
+        filter_start = time.perf_counter()
+        reused_slices = 0
         if keywords:
+            matcher = KeywordMatcher(keywords)
             filtered_data = {}
             for tool_name, tool_data in context_data.items():
-                if isinstance(tool_data, dict):
-                    filtered_accounts = {}
-                    for account_id, account_data in tool_data.items():
-                        if isinstance(account_data, dict):
-                            filtered_services = {}
-                            for service_name, resources in account_data.items():
-                                # 리소스 필터링
-                                if isinstance(resources, list):
-                                    filtered_resources = []
-                                    for resource in resources:
-                                        resource_str = json.dumps(resource, default=str).lower()
-                                        # 키워드가 포함된 리소스만 선택
-                                        if any(kw in resource_str for kw in keywords):
-                                            filtered_resources.append(resource)
-                                    if filtered_resources:
-                                        filtered_services[service_name] = filtered_resources
-                                else:
-                                    filtered_services[service_name] = resources
-                            if filtered_services:
-                                filtered_accounts[account_id] = filtered_services
-                        else:
-                            filtered_accounts[account_id] = account_data
-                    if filtered_accounts:
-                        filtered_data[tool_name] = filtered_accounts
+                call_key = call_keys.get(tool_name)
+                slice_key = (call_key, tuple(keywords))
+                if working_set is not None and slice_key in working_set["slices"]:
+                    filtered = working_set["slices"][slice_key]
+                    reused_slices += 1
                 else:
-                    filtered_data[tool_name] = tool_data
+                    # 직렬화 색인은 (도구 호출 키, 스냅샷)별로 모든 세션이 공유하고, 작업 집합은 참조만 보관
+                    index = working_set["indexes"].get(call_key) if working_set is not None else None
+                    if index is None and isinstance(tool_data, dict):
+                        if working_set is not None and call_key in working_set["tool_results"]:
+                            index = get_resource_index((call_key, working_set["snapshot"]), tool_data, metrics)
+                            remember(working_set["indexes"], call_key, index, WORKING_SET_MAX_TOOLS)
+                        else:
+                            with timed(metrics, "filter.index"):
+                                index = ResourceIndex(tool_data)
+                    filtered = filter_tool_data(tool_data, matcher, index)
+                    if working_set is not None and tool_name in call_keys:
+                        remember(working_set["slices"], slice_key, filtered, WORKING_SET_MAX_TOOLS * 4)
+                if filtered is not None:
+                    filtered_data[tool_name] = filtered
             
             # 필터링된 데이터가 있으면 사용, 없으면 원본 사용
             if filtered_data:
                 context_data = filtered_data
+        record_span(metrics, "filter", filter_start)
+        if metrics is not None and working_set is not None:
+            metrics["sizes"]["tools_reused"] = len(reused_tools)
+            metrics["sizes"]["tools_fetched"] = len(call_keys) - len(reused_tools)
+            metrics["sizes"]["slices_reused"] = reused_slices
         
         # 5. 수집된 데이터로 최종 답변 생성
         # 데이터 크기 제한을 늘림 (15000 → 30000)
-        context = json.dumps(context_data, indent=2, default=str, ensure_ascii=False)[:30000]
+        with timed(metrics, "context.serialize"):
+            full_context = json.dumps(context_data, indent=2, default=str, ensure_ascii=False)
+        context = full_context[:30000]
+        if metrics is not None:
+            metrics["sizes"]["context_chars"] = len(full_context)
+            metrics["sizes"]["context_sent_chars"] = len(context)
+        
+        # 이전 대화 (후속 질문이 앞선 질문/답변을 참조할 수 있도록)
+        history = ""
+        if working_set and working_set["turns"]:
+            history = "\n이전 대화:\n" + "\n".join(
+                f"Q: {turn['prompt']}\nA: {turn['answer']}" for turn in working_set["turns"]
+            ) + "\n"
         
         full_prompt = f"""
-당신은 AWS CMDB 전문가입니다. 다음 MCP 도구로 수집한 CMDB 데이터를 바탕으로 질문에 답해주세요.
+당신은 AWS/GCP CMDB 전문가입니다. 다음 MCP 도구로 수집한 CMDB 데이터를 바탕으로 질문에 답해주세요.
 
+클라우드: {CLOUD_PROVIDER}
 사용된 MCP 도구: {', '.join(selected_tools)}
 검색 키워드: {', '.join(keywords) if keywords else '없음'}
-
+{history}
 CMDB 데이터:
 {context}
 
@@ -437,17 +956,26 @@ CMDB 데이터:
             ]
         })
         
-        response = bedrock.invoke_model(
-            modelId='anthropic.claude-3-sonnet-20240229-v1:0',
-            body=body
-        )
-        
-        result = json.loads(response['body'].read())
+        with timed(metrics, "invoke_model"):
+            response = bedrock.invoke_model(
+                modelId='anthropic.claude-3-sonnet-20240229-v1:0',
+                body=body
+            )
+            result = json.loads(response['body'].read())
+        record_usage(metrics, "invoke_model", result)
         ai_response = result['content'][0]['text']
         
         # AI 답변에서 민감 정보 익명화
         ai_response = anonymize_ai_response(ai_response)
         
+        if working_set is not None:
+            working_set["turns"].append({
+                "prompt": prompt,
+                "answer": ai_response[:WORKING_SET_ANSWER_CHARS],
+                "tools": list(context_data) or selected_tools
+            })
+            del working_set["turns"][:-WORKING_SET_MAX_TURNS]
+        
         return ai_response
     
     except Exception as e:
@@ -481,6 +1009,35 @@ def anonymize_ai_response(text):
     
     return text
 
+def render_turn_metrics(metrics):
+    """채팅 턴의 구간별 처리 시간 패널"""
+    with st.expander(f"⏱️ 처리 시간 {metrics.get('total_ms', 0) / 1000:.2f}초"):
+        if metrics["spans"]:
+            df = pd.DataFrame(metrics["spans"])
+            fig = px.bar(df, x='ms', y='name', orientation='h', title='구간별 소요 시간 (ms)')
+            fig.update_layout(yaxis={'categoryorder': 'array', 'categoryarray': df['name'][::-1].tolist()},
+                              height=max(250, 28 * len(df)))
+            st.plotly_chart(fig, use_container_width=True)
+        cols = st.columns(3)
+        input_tokens = sum(t["input"] for t in metrics["tokens"].values())
+        output_tokens = sum(t["output"] for t in metrics["tokens"].values())
+        cols[0].metric("입력 토큰", input_tokens)
+        cols[1].metric("출력 토큰", output_tokens)
+        cols[2].metric("컨텍스트 크기", f"{metrics['sizes'].get('context_chars', 0):,}자")
+        if metrics["sizes"]:
+            st.json(metrics["sizes"])
+
+@st.cache_data(ttl=WORKING_SET_DATE_TTL, show_spinner=False)
+def fetch_resource_summary(provider, dates):
+    """MCP get_resource_summary 결과 (서버의 스냅샷 캐시와 병렬 로드 사용)
+    
+    dates((provider, date) 튜플)가 바뀔 때까지 재사용. 조회 실패는 예외로 올려서 캐시하지 않음
+    """
+    result = call_mcp_tool("get_resource_summary", **with_date({"provider": provider}, dict(dates).get(provider)))
+    if not isinstance(result, dict) or set(result) == {"error"}:
+        raise RuntimeError(result.get("error") if isinstance(result, dict) else "응답 없음")
+    return result
+
 def create_resource_summary():
     """리소스 요약 대시보드"""
     st.subheader("📊 리소스 요약")
@@ -496,28 +1053,31 @@ def create_resource_summary():
     
     col1, col2, col3 = st.columns(3)
     
+    providers = list(PROVIDERS) if CLOUD_PROVIDER == 'all' else [CLOUD_PROVIDER]
+    dates = get_working_set()["dates"]
+    try:
+        summary = fetch_resource_summary(CLOUD_PROVIDER, tuple(sorted(dates.items())))
+    except Exception as e:
+        st.error(f"리소스 요약 조회 실패: {e}")
+        return
+    by_provider = summary.get("providers", {}) if CLOUD_PROVIDER == 'all' else {CLOUD_PROVIDER: summary}
     summary_data = []
-    for cat_key, cat_name in categories.items():
-        data = load_cmdb_data(cat_key)
-        if 'error' not in data:
-            resource_count = 0
-            for account_data in data.values():
-                if isinstance(account_data, dict):
-                    for service_data in account_data.values():
-                        if isinstance(service_data, list):
-                            resource_count += len(service_data)
-            
-            summary_data.append({
-                'Category': cat_name,
-                'Resources': resource_count,
-                'Key': cat_key
-            })
+    for provider in providers:
+        for cat_key, cat_name in categories.items():
+            stats = by_provider.get(provider, {}).get(cat_key)
+            if stats and 'error' not in stats:
+                summary_data.append({
+                    'Provider': provider,
+                    'Category': cat_name,
+                    'Resources': stats.get('total_resources', 0),
+                    'Key': cat_key
+                })
     
     if summary_data:
         df = pd.DataFrame(summary_data)
         
         with col1:
-            fig = px.bar(df, x='Category', y='Resources', 
+            fig = px.bar(df, x='Category', y='Resources', color='Provider',
                         title='카테고리별 리소스 수')
             fig.update_layout(xaxis_tickangle=45)
             st.plotly_chart(fig, use_container_width=True)
@@ -530,9 +1090,59 @@ def create_resource_summary():
         with col3:
             st.metric("총 리소스", df['Resources'].sum())
             st.metric("카테고리 수", len(df))
-            st.metric("최신 데이터", get_latest_date())
+            for provider in providers:
+                st.metric(f"최신 데이터 ({provider})", summary.get("dates", dates).get(provider) or get_latest_date(provider))
+
+def create_resource_trend():
+    """날짜별 리소스 추이 차트 (MCP get_resource_trend 사용)"""
+    st.subheader("📈 리소스 추이")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        category = st.selectbox(
+            "카테고리",
+            ["identity_policies", "storage_policies", "compute_policies",
+             "database_policies", "network_policies", "security_policies"],
+            key="trend_category"
+        )
+    with col2:
+        service = st.text_input("서비스 (선택)", placeholder="예: IAM, S3, SecurityGroups", key="trend_service")
+    with col3:
+        rule_id = st.text_input("점검 규칙 (선택)", placeholder="예: s3_public_bucket", key="trend_rule")
+    with col4:
+        days = st.slider("기간 (일)", 7, 180, 90, key="trend_days")
+    
+    if st.button("추이 조회"):
+        end = get_latest_date(CLOUD_PROVIDER if CLOUD_PROVIDER in PROVIDERS else 'aws')
+        start = (datetime.strptime(end, '%Y%m%d') - pd.Timedelta(days=days)).strftime('%Y%m%d')
+        with st.spinner("추이 계산 중..."):
+            args = {"category": category, "start": start, "end": end,
+                    "provider": CLOUD_PROVIDER if CLOUD_PROVIDER in PROVIDERS else 'aws'}
+            if service:
+                args["service"] = service
+            if rule_id:
+                args["rule_id"] = rule_id
+            trend = call_mcp_tool("get_resource_trend", **args)
+        if 'error' in trend:
+            st.error(f"추이 조회 실패: {trend['error']}")
+        elif not trend.get('points'):
+            st.warning("💭 기간 내 스냅샷이 없습니다.")
+        else:
+            df = pd.DataFrame(trend['points'])
+            df['date'] = pd.to_datetime(df['date'], format='%Y%m%d')
+            label = rule_id or service or category
+            fig = px.line(df, x='date', y='count', markers=True, title=f"{label} 추이")
+            st.plotly_chart(fig, use_container_width=True)
+            if 'change' in trend:
+                st.metric("기간 내 변화", int(df['count'].iloc[-1]), delta=int(trend['change']))
+            if trend.get('errors'):
+                st.warning(f"일부 날짜 조회 실패: {', '.join(trend['errors'])}")
 
 def main():
+    # 페이지 로드 시점에 MCP 서버를 미리 띄워서 첫 질문 전에 워밍업이 진행되도록 함
+    if not MCP_SERVER_URL:
+        start_mcp_server()
+    
     st.title("🔍 CMDB 챗봇")
     st.markdown("AWS/GCP CMDB 정책 데이터를 조회하고 분석하는 AI 챗봇입니다.")
     
@@ -546,10 +1156,17 @@ def main():
         if "messages" not in st.session_state:
             st.session_state.messages = []
         
+        # 대화와 작업 집합(재사용 중인 도구 결과) 초기화
+        if st.session_state.messages and st.button("🧹 새 대화"):
+            st.session_state.messages = []
+            st.session_state.pop("working_set", None)
+        
         # 채팅 히스토리 표시
         for message in st.session_state.messages:
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
+                if message.get("metrics"):
+                    render_turn_metrics(message["metrics"])
         
         # 사용자 입력
         if prompt := st.chat_input("CMDB에 대해 질문해보세요 (예: IAM 정책 현황은?"):
@@ -562,18 +1179,28 @@ def main():
             with st.chat_message("assistant"):
                 with st.spinner("분석 중..."):
                     # MCP 도구를 활용한 응답 생성
-                    response = query_bedrock_with_mcp_tools(prompt)
+                    metrics = new_turn_metrics()
+                    turn_start = time.perf_counter()
+                    response = query_bedrock_with_mcp_tools(prompt, metrics, get_working_set())
+                    metrics["total_ms"] = round((time.perf_counter() - turn_start) * 1000, 1)
+                    write_turn_metrics(metrics)
                     st.markdown(response)
+                render_turn_metrics(metrics)
             
             # AI 응답 저장
-            st.session_state.messages.append({"role": "assistant", "content": response})
+            st.session_state.messages.append({"role": "assistant", "content": response, "metrics": metrics})
     
     with tab2:
         create_resource_summary()
+        create_resource_trend()
     
     with tab3:
         st.subheader("🔍 데이터 탐색")
         
+        # MCP 서버 계측 (공유 HTTP 서버일 때 누적 값이 의미 있음)
+        if st.button("MCP 서버 통계"):
+            st.json(call_mcp_tool("get_server_stats"))
+        
         # S3 구조 확인
         if st.button("S3 버킷 구조 확인"):
             structure = list_s3_structure()
@@ -588,19 +1215,26 @@ def main():
              "database_policies", "network_policies", "security_policies"]
         )
         
+        # 제공자 선택 (사이드바가 all이면 개별 선택)
+        provider = st.selectbox(
+            "클라우드 선택",
+            list(PROVIDERS),
+            index=list(PROVIDERS).index(CLOUD_PROVIDER) if CLOUD_PROVIDER in PROVIDERS else 0
+        )
+        
         # 날짜 선택
         date = st.date_input("날짜 선택", value=datetime.now())
         date_str = date.strftime('%Y%m%d')
         
         # 예상 파일 경로 표시
-        expected_key = f"aws-policies/{date_str}/{category}.json"
+        expected_key = f"{PROVIDERS[provider]}/{date_str}/{category}.json (.gz/.zst 우선)"
         st.info(f"📄 예상 파일 경로: {expected_key}")
         
         if st.button("데이터 로드"):
             # 데이터 탐색에서는 익명화 적용 (테이블 뷰 제외)
-            data = load_cmdb_data(category, date_str, anonymize=True)
+            data = load_cmdb_data(category, date_str, anonymize=True, provider=provider)
             # 테이블 뷰용 원본 데이터
-            original_data = load_cmdb_data(category, date_str, anonymize=False)
+            original_data = load_cmdb_data(category, date_str, anonymize=False, provider=provider)
             
             if 'error' in data:
                 st.error(f"데이터 로드 실패: {data['error']}")